@@ -0,0 +1,126 @@
+'''
+Micro-benchmark of model.mgu against the substitute-and-rescan unifier
+it replaced. Run from anywhere:
+
+    python bench/bench_mgu.py
+'''
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import model
+from model import Functor, Args
+
+'''
+REFERENCE: the previous unifier. It finds the first disagreement, binds it,
+substitutes into both complete terms and scans again from the root.
+'''
+def disagree(a, b):
+    if a is b:
+        return None
+    elif type(a) != type(b):
+        return (a, b)
+    elif type(a) is not int:
+        return next(
+            (d for d in (disagree(x, y) for (x, y) in zip(a, b)) if d is not None),
+            None
+        )
+    elif a != b:
+        return (a, b)
+    else:
+        return None
+
+def variable_in(x, y):
+    if type(y) is int:
+        return x == y
+    else:
+        return any(variable_in(x, z) for z in y)
+
+def reference_mgu(a, b):
+    sub = {}
+
+    while True:
+        diff = disagree(a, b)
+
+        if diff is None:
+            return sub
+
+        if model.is_variable(diff[0]) and not variable_in(diff[0], diff[1]):
+            binding = {diff[0]: diff[1]}
+        elif model.is_variable(diff[1]) and not variable_in(diff[1], diff[0]):
+            binding = {diff[1]: diff[0]}
+        else:
+            return None
+
+        sub = {x: model.substitute(y, binding) for x, y in sub.items()}
+        sub.update(binding)
+
+        a = model.substitute(a, sub)
+        b = model.substitute(b, sub)
+
+'''
+WORKLOADS
+'''
+f = model.newconst('f')
+g = model.newconst('g')
+constants = [model.newconst('k%d' % (i,)) for i in range(4)]
+variables = [model.newvar('x%d' % (i,)) for i in range(12)]
+
+def random_term(rng, depth):
+    if depth == 0 or rng.random() < 0.2:
+        return rng.choice(constants)
+    if rng.random() < 0.5:
+        return Functor(g, Args(random_term(rng, depth - 1)))
+    return Functor(f, Args(random_term(rng, depth - 1), random_term(rng, depth - 1)))
+
+# Replace random subterms by variables, so that the result unifies with the original
+def generalize(rng, term):
+    if rng.random() < 0.15:
+        return rng.choice(variables)
+    if type(term) is int:
+        return term
+    return Functor(term.functor, Args(*(generalize(rng, x) for x in term.arguments)))
+
+def unifiable_pairs(rng, depth, n):
+    pairs = []
+    for _ in range(n):
+        term = random_term(rng, depth)
+        pairs.append((generalize(rng, term), generalize(rng, term)))
+    return pairs
+
+def failing_pairs(rng, depth, n):
+    return [(generalize(rng, random_term(rng, depth)), generalize(rng, random_term(rng, depth))) for _ in range(n)]
+
+# f(x0, f(x1, ...)) against f(g(x1), f(g(x2), ...)): every binding forces a rescan
+def chain_pair(n):
+    left = constants[0]
+    right = constants[0]
+    for i in reversed(range(n)):
+        left = Functor(f, Args(variables[i], left))
+        right = Functor(f, Args(Functor(g, Args(variables[i + 1])) if i + 1 < n else constants[0], right))
+    return [(left, right)]
+
+def same(sub_a, sub_b, a, b):
+    if sub_a is None or sub_b is None:
+        return sub_a is None and sub_b is None
+    return model.substitute(a, sub_a) is model.substitute(b, sub_a) and model.substitute(a, sub_b) is model.substitute(b, sub_b)
+
+def run(name, pairs, number):
+    for a, b in pairs:
+        assert same(model.mgu(a, b), reference_mgu(a, b), a, b), (name, a, b)
+
+    new = timeit.timeit(lambda: [model.mgu(a, b) for a, b in pairs], number = number)
+    old = timeit.timeit(lambda: [reference_mgu(a, b) for a, b in pairs], number = number)
+    calls = number * len(pairs)
+    print('%-20s %10.2f %10.2f %8.1fx' % (name, old / calls * 1e6, new / calls * 1e6, old / new))
+
+if __name__ == '__main__':
+    rng = random.Random(0)
+    print('%-20s %10s %10s %9s' % ('workload', 'old (us)', 'new (us)', 'speedup'))
+    run('unifiable depth 4', unifiable_pairs(rng, 4, 200), 20)
+    run('unifiable depth 8', unifiable_pairs(rng, 8, 200), 5)
+    run('failing depth 6', failing_pairs(rng, 6, 200), 20)
+    run('chain length 10', chain_pair(10), 200)
@@ -0,0 +1,121 @@
+'''
+Benchmark of the parser over files of random axioms, written once to a
+temporary directory. Run from anywhere:
+
+    python bench/bench_parser.py [--formulas N] [--seed S] [--repeat N] [--no-memory]
+
+A formula file is tokenized, parsed into trees by parser.formulas and
+clausified a statement at a time by parser.cnf, and a clause file of as
+many clauses is read by parser.clauses, which skips model.cnf. For each
+stage, a JSON line goes to stdout with its seconds, the statements it
+read per second and, unless --no-memory, the peak of memory allocated
+while reading, which stays small however large the file is, since no
+stage holds more than a statement at a time.
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import model
+import parser
+
+FUNCTORS = (('f', 2), ('g', 1), ('h', 3))
+RELATIONS = (('P', 1), ('Q', 2), ('R', 3))
+CONSTANTS = ('A', 'B', 'C', '0')
+INFIX = ('+', '*')
+
+def term(rng, variables, depth):
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice(variables + CONSTANTS if variables else CONSTANTS)
+    if rng.random() < 0.3:
+        return '(%s %s %s)' % (term(rng, variables, depth - 1), rng.choice(INFIX), term(rng, variables, depth - 1))
+    name, arity = rng.choice(FUNCTORS)
+    return '%s(%s)' % (name, ', '.join(term(rng, variables, depth - 1) for _ in range(arity)))
+
+def atom(rng, variables):
+    if rng.random() < 0.3:
+        return '%s = %s' % (term(rng, variables, 3), term(rng, variables, 3))
+    name, arity = rng.choice(RELATIONS)
+    return '%s[%s]' % (name, ', '.join(term(rng, variables, 2) for _ in range(arity)))
+
+def formula(rng, variables, depth):
+    if depth == 0 or rng.random() < 0.25:
+        return atom(rng, variables)
+    choice = rng.random()
+    if choice < 0.2:
+        x = 'x%d' % (len(variables),)
+        return '%s %s. %s' % (rng.choice(('forall', 'exists')), x, formula(rng, variables + (x,), depth - 1))
+    if choice < 0.3:
+        return 'not [%s]' % (formula(rng, variables, depth - 1),)
+    return '[%s] %s [%s]' % (formula(rng, variables, depth - 1), rng.choice(('and', 'or', '=>', '<=>')), formula(rng, variables, depth - 1))
+
+def clause(rng):
+    variables = tuple('xyzw')
+    return ' | '.join(('~' if rng.random() < 0.5 else '') + atom(rng, variables) for _ in range(rng.randint(1, 5)))
+
+def write(path, lines):
+    with open(path, 'w') as file:
+        for line in lines:
+            file.write(line + ';\n')
+
+def tokens(path):
+    with open(path) as file:
+        stream = parser.Tokens(file)
+        n = 0
+        while stream.take() is not None:
+            n += 1
+        return n
+
+def read(function, path):
+    with model.scope(model.SymbolTable()):
+        with open(path) as file:
+            return sum(1 for _ in function(file))
+
+def stage(name, read_all, statements, repeat, memory):
+    seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = read_all()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    result = {'stage': name, 'seconds': seconds, 'statements': statements, 'per second': statements / seconds, 'read': count}
+    if memory:
+        tracemalloc.start()
+        try:
+            read_all()
+            result['peak'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description = 'Benchmark the parser over files of random axioms.')
+    arguments.add_argument('--formulas', type = int, default = 5000, help = 'how many statements each file has')
+    arguments.add_argument('--seed', type = int, default = 0)
+    arguments.add_argument('--repeat', type = int, default = 1, help = 'take the best of this many runs of each stage')
+    arguments.add_argument('--no-memory', dest = 'memory', action = 'store_false', help = 'skip measuring peak memory')
+    options = arguments.parse_args()
+
+    rng = random.Random(options.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        formulas = os.path.join(directory, 'formulas.txt')
+        clauses = os.path.join(directory, 'clauses.txt')
+        write(formulas, (formula(rng, (), 4) for _ in range(options.formulas)))
+        write(clauses, (clause(rng) for _ in range(options.formulas)))
+
+        n = options.formulas
+        for name, read_all, path in (
+                ('tokens', lambda: tokens(formulas), formulas),
+                ('formulas', lambda: read(parser.formulas, formulas), formulas),
+                ('cnf', lambda: read(parser.cnf, formulas), formulas),
+                ('clauses', lambda: read(parser.clauses, clauses), clauses)):
+            result = stage(name, read_all, n, options.repeat, options.memory)
+            result['bytes'] = os.path.getsize(path)
+            print(json.dumps(result), flush = True)
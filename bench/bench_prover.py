@@ -0,0 +1,213 @@
+'''
+Benchmark of the prover over the problems in problems.py. Each problem is
+clausified with model.cnf, its atoms unified pairwise with model.mgu, its
+clauses reduced pairwise with deduction.reductions, and then refuted end
+to end with deduction.find_contradiction, every stage timed on its own.
+Run from anywhere:
+
+    python bench/bench_prover.py [--repeat N] [--output results.json]
+        [--baseline bench/baseline.json] [--save bench/baseline.json]
+        [--strategy NAME ...] [--no-memory] [names of problems, or parts of them]
+
+For each problem, a JSON line goes to stdout with the seconds of each
+stage, the given and generated clause counts of the search, the length
+of its proof and, unless --no-memory, the peak of memory allocated while
+searching, measured by tracemalloc in a separate run so as not to slow
+the timed one. Given --baseline, results are compared with those saved
+by --save, and regressions are listed on stderr, and make the exit
+status 1.
+
+Each problem is searched with each strategy given, the default one
+unless any are, and then a table of the clauses each strategy generated
+goes to stderr. Strategies other than the default may be incomplete, so
+only the default one has to prove what is expected.
+'''
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import model
+import deduction
+import metrics
+import flatterm
+import selection
+import problems
+
+# Slower by more than this fraction, and by more than NOISE seconds, is
+# a regression; the same fraction applies to counts and memory
+TOLERANCE = 0.2
+NOISE = 0.05
+
+# Reductions, as counted by metrics, are the clauses a search generates
+INFERENCES = flatterm.NOTES[:3] + ('equality factoring', 'factoring')
+
+# Options for find_contradiction, on top of those of the problem
+STRATEGIES = {
+    'default': {},
+    'set of support': {'set_of_support': True},
+    'negative selection': {'selection': selection.negative},
+    'hyperresolution': {'calculus': 'hyperresolution'},
+    'four unifiers': {'max_unifiers': 4},
+}
+
+# Searches that may never end, with strategies other than the default,
+# stop after this many selections
+MAX_GIVEN = 2000
+
+def best(function, repeat):
+    '''
+    The least time function takes in repeat calls, and what it returned.
+    '''
+    seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if seconds is None or elapsed < seconds:
+            seconds = elapsed
+    return seconds, result
+
+def clausify(axioms, goal):
+    cnf = set()
+    for x in axioms:
+        cnf |= model.cnf(x)
+    return cnf, model.cnf(model.Not(goal))
+
+def atoms(clauses):
+    return [x.body if type(x) is model.Not else x for clause in clauses for x in clause]
+
+def unify_all(left, right):
+    return sum(model.mgu(a, b) is not None for a in left for b in right)
+
+def reduce_all(clauses):
+    return sum(1 for a in clauses for b in clauses for _ in deduction.reductions(a, b))
+
+def search(cnf, negation, options, collect = None):
+    return deduction.find_contradiction(cnf | negation, None, goal = negation, metrics = collect, **options)
+
+def run(name, strategy, repeat, memory):
+    build, options = problems.PROBLEMS[name]
+    options = dict(options, **STRATEGIES[strategy])
+    expected = options.pop('expected', True)
+    if strategy != 'default':
+        options.setdefault('max_given', MAX_GIVEN)
+    result = {'problem': name, 'strategy': strategy, 'expected': expected}
+
+    with model.scope(model.SymbolTable()):
+        axioms, goal = build()
+
+        result['cnf'], (cnf, negation) = best(lambda: clausify(axioms, goal), repeat)
+        clauses = [model.canon(x) for x in cnf | negation]
+        result['clauses'] = len(clauses)
+
+        left = atoms(clauses)
+        right = atoms(model.uniquify(x) for x in clauses)
+        result['mgu'], result['unifiable'] = best(lambda: unify_all(left, right), repeat)
+        result['unifications'] = len(left) * len(right)
+
+        result['reductions'], result['reduced'] = best(lambda: reduce_all(clauses), repeat)
+
+        collected = []
+        def measured():
+            collected.append(metrics.Metrics(every = 0))
+            return search(cnf, negation, options, collected[-1])
+        result['search'], proof = best(measured, repeat)
+        result['total'] = result['cnf'] + result['search']
+
+        counters = collected[-1].counters
+        result['proved'] = proof is not None
+        result['given'] = collected[-1].given
+        result['generated'] = sum(counters[kind] for kind in INFERENCES)
+        result['proof'] = len(proof) if proof is not None else None
+
+        if memory:
+            tracemalloc.start()
+            try:
+                search(cnf, negation, options, metrics.Metrics(every = 0))
+                result['peak'] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return result
+
+'''
+BASELINE
+'''
+def regressions(result, baseline):
+    '''
+    Describe each way result is worse than baseline, for one problem.
+    '''
+    found = []
+    if baseline.get('proved') and not result['proved']:
+        found.append('no longer proved')
+    for key in ('cnf', 'mgu', 'reductions', 'search', 'total'):
+        old, new = baseline.get(key), result.get(key)
+        if old is not None and new is not None and new > old * (1 + TOLERANCE) and new - old > NOISE:
+            found.append('%s %.3fs -> %.3fs' % (key, old, new))
+    for key in ('given', 'generated', 'proof', 'peak'):
+        old, new = baseline.get(key), result.get(key)
+        if old is not None and new is not None and new > old * (1 + TOLERANCE):
+            found.append('%s %d -> %d' % (key, old, new))
+    return found
+
+def load(path):
+    with open(path) as file:
+        return {(x['problem'], x.get('strategy', 'default')): x for x in json.load(file)}
+
+# The clauses each strategy generated for each problem, or '-' where it
+# found no proof
+def table(results, strategies):
+    generated = {(x['problem'], x['strategy']): x for x in results}
+    width = max(len(x) for x in problems.PROBLEMS)
+    lines = [' ' * width + ''.join('%20s' % (x,) for x in strategies)]
+    for name in dict.fromkeys(x['problem'] for x in results):
+        lines.append(name.ljust(width) + ''.join(
+            '%20s' % (generated[name, x]['generated'] if generated[name, x]['proved'] else '-',)
+            for x in strategies
+        ))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark the prover over a corpus of problems.')
+    parser.add_argument('names', nargs = '*', help = 'only the problems with one of these in their names')
+    parser.add_argument('--repeat', type = int, default = 1, help = 'take the best of this many runs of each stage')
+    parser.add_argument('--output', help = 'write all results to this file, as one JSON list')
+    parser.add_argument('--baseline', help = 'compare with the results saved in this file')
+    parser.add_argument('--save', help = 'save the results as a baseline to this file')
+    parser.add_argument('--strategy', action = 'append', choices = list(STRATEGIES), help = 'search with this strategy, which can be given more than once')
+    parser.add_argument('--no-memory', dest = 'memory', action = 'store_false', help = 'skip measuring peak memory')
+    arguments = parser.parse_args()
+
+    names = [name for name in problems.PROBLEMS if not arguments.names or any(x in name for x in arguments.names)]
+    strategies = arguments.strategy or ['default']
+    baseline = load(arguments.baseline) if arguments.baseline else {}
+
+    results = []
+    failed = []
+    for name in names:
+        for strategy in strategies:
+            result = run(name, strategy, arguments.repeat, arguments.memory)
+            results.append(result)
+            print(json.dumps(result), flush = True)
+
+            label = name if strategy == 'default' else '%s (%s)' % (name, strategy)
+            if strategy == 'default' and result['proved'] != result['expected']:
+                failed.append('%s: %s' % (label, 'proved' if result['proved'] else 'not proved'))
+            if (name, strategy) in baseline:
+                failed.extend('%s: %s' % (label, x) for x in regressions(result, baseline[name, strategy]))
+
+    for path in (arguments.output, arguments.save):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(results, file, indent = 1)
+                file.write('\n')
+
+    if len(strategies) > 1:
+        print(table(results, strategies), file = sys.stderr)
+    for line in failed:
+        print('REGRESSION ' + line, file = sys.stderr)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,263 @@
+'''
+The problems bench_prover.py runs. Each is a function that states its
+axioms and its goal, as trees, in the symbol table in scope, which the
+harness makes new for every problem, and returns them as (axioms, goal).
+The goal is a theorem of the axioms, unless the problem is marked as
+expected to saturate.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import model
+import orderings
+import parser
+from model import Universal, Existential, And, Or, Implies, Iff, Not, Relation, Functor, Args
+
+PROBLEMS = {}
+
+# Register a problem under its name, with the options its search takes
+def problem(name, **options):
+    def register(function):
+        PROBLEMS[name] = (function, options)
+        return function
+    return register
+
+def equal(a, b):
+    return Relation(0, Args(a, b))
+
+def apply(f, *arguments):
+    return Functor(f, Args(*arguments))
+
+def forall(variables, body):
+    for x in reversed(variables):
+        body = Universal(x, body)
+    return body
+
+def atom(p):
+    return Relation(p, Args())
+
+def disjunction(xs):
+    result = xs[-1]
+    for x in reversed(xs[:-1]):
+        result = Or(x, result)
+    return result
+
+'''
+GROUPS
+'''
+def group():
+    times = model.newconst('*')
+    inverse = model.newconst('i')
+    e = model.newconst('e')
+    x, y, z = (model.newvar(name) for name in 'xyz')
+    axioms = [
+        forall([x], equal(apply(times, e, x), x)),
+        forall([x], equal(apply(times, apply(inverse, x), x), e)),
+        forall([x, y, z], equal(apply(times, apply(times, x, y), z), apply(times, x, apply(times, y, z)))),
+    ]
+    return axioms, times, inverse, e, x, y
+
+@problem('group right identity')
+def group_right_identity():
+    axioms, times, inverse, e, x, y = group()
+    return axioms, forall([x], equal(apply(times, x, e), x))
+
+@problem('group right inverse')
+def group_right_inverse():
+    axioms, times, inverse, e, x, y = group()
+    return axioms, forall([x], equal(apply(times, x, apply(inverse, x)), e))
+
+@problem('group inverse of inverse')
+def group_inverse_of_inverse():
+    axioms, times, inverse, e, x, y = group()
+    return axioms, forall([x], equal(apply(inverse, apply(inverse, x)), x))
+
+@problem('group inverse of product', max_cost = 3000)
+def group_inverse_of_product():
+    axioms, times, inverse, e, x, y = group()
+    return axioms, forall([x, y], equal(
+        apply(inverse, apply(times, x, y)),
+        apply(times, apply(inverse, y), apply(inverse, x))
+    ))
+
+# Every element its own inverse makes the group commutative
+@problem('group exponent two')
+def group_exponent_two():
+    axioms, times, inverse, e, x, y = group()
+    axioms.append(forall([x], equal(apply(times, x, x), e)))
+    return axioms, forall([x, y], equal(apply(times, x, y), apply(times, y, x)))
+
+'''
+RINGS: with + and * associative and commutative, handled by ac. Under
+KBO, distributivity factors sums instead of expanding products, so some
+of these are searched with LPO, which ranks * above + as it comes later.
+'''
+def ring():
+    plus = model.newconst('+')
+    times = model.newconst('*')
+    minus = model.newconst('-')
+    zero = model.newconst('0')
+    model.ac_operators.update((plus, times))
+    x, y, z = (model.newvar(name) for name in 'xyz')
+    axioms = [
+        forall([x], equal(apply(plus, x, zero), x)),
+        forall([x], equal(apply(plus, x, apply(minus, x)), zero)),
+        forall([x, y, z], equal(apply(times, x, apply(plus, y, z)), apply(plus, apply(times, x, y), apply(times, x, z)))),
+    ]
+    return axioms, plus, times, minus, zero, x, y
+
+@problem('ring times zero', ordering = orderings.LPO())
+def ring_times_zero():
+    axioms, plus, times, minus, zero, x, y = ring()
+    return axioms, forall([x], equal(apply(times, x, zero), zero))
+
+@problem('ring minus zero')
+def ring_minus_zero():
+    axioms, plus, times, minus, zero, x, y = ring()
+    return axioms, equal(apply(minus, zero), zero)
+
+@problem('ring square of sum', ordering = orderings.LPO())
+def ring_square_of_sum():
+    axioms, plus, times, minus, zero, x, y = ring()
+    return axioms, forall([x, y], equal(
+        apply(times, apply(plus, x, y), apply(plus, x, y)),
+        apply(plus, apply(times, x, x), apply(plus, apply(times, x, y), apply(plus, apply(times, x, y), apply(times, y, y))))
+    ))
+
+@problem('ring minus minus')
+def ring_minus_minus():
+    axioms, plus, times, minus, zero, x, y = ring()
+    return axioms, forall([x, y], equal(apply(plus, apply(plus, x, y), apply(plus, apply(minus, x), apply(minus, y))), zero))
+
+# The example of deduction.py, with cancellation instead of inverses
+@problem('zeroprod')
+def zeroprod():
+    plus = model.newconst('+')
+    times = model.newconst('*')
+    zero = model.newconst('0')
+    model.ac_operators.update((plus, times))
+    a, b, c = (model.newvar(name) for name in 'abc')
+    axioms = [
+        forall([a, b, c], Implies(equal(apply(plus, a, b), apply(plus, a, c)), equal(b, c))),
+        forall([a, b, c], equal(apply(times, a, apply(plus, b, c)), apply(plus, apply(times, a, b), apply(times, a, c)))),
+        forall([a], equal(apply(plus, a, zero), a)),
+    ]
+    return axioms, forall([a], equal(apply(times, a, zero), zero))
+
+'''
+FIRST ORDER, without equality
+'''
+@problem('transitive chain')
+def transitive_chain():
+    less = model.newconst('<')
+    x, y, z = (model.newvar(name) for name in 'xyz')
+    points = [model.newconst('p%d' % (i,)) for i in range(8)]
+    axioms = [forall([x, y, z], Implies(And(Relation(less, Args(x, y)), Relation(less, Args(y, z))), Relation(less, Args(x, z))))]
+    axioms += [Relation(less, Args(p, q)) for p, q in zip(points, points[1:])]
+    return axioms, Relation(less, Args(points[0], points[-1]))
+
+# If everyone has a parent, and a parent of a parent is a grandparent,
+# everyone has a grandparent
+@problem('grandparents')
+def grandparents():
+    parent = model.newconst('parent')
+    grandparent = model.newconst('grandparent')
+    x, y, z = (model.newvar(name) for name in 'xyz')
+    axioms = [
+        Universal(x, Existential(y, Relation(parent, Args(y, x)))),
+        forall([x, y, z], Implies(
+            And(Relation(parent, Args(x, y)), Relation(parent, Args(y, z))),
+            Relation(grandparent, Args(x, z))
+        )),
+    ]
+    return axioms, Universal(x, Existential(y, Relation(grandparent, Args(y, x))))
+
+'''
+PROPOSITIONAL
+'''
+# n + 1 pigeons do not fit in n holes
+def pigeonhole(n):
+    holes = [[atom(model.newconst('p%d%d' % (i, j))) for j in range(n)] for i in range(n + 1)]
+    axioms = []
+    for i in range(n + 1):
+        axioms.append(disjunction(holes[i]))
+    for j in range(n):
+        for i in range(n + 1):
+            for k in range(i + 1, n + 1):
+                axioms.append(Not(And(holes[i][j], holes[k][j])))
+    return axioms, atom(model.newconst('false'))
+
+@problem('pigeonhole 3')
+def pigeonhole_3():
+    return pigeonhole(3)
+
+@problem('pigeonhole 4')
+def pigeonhole_4():
+    return pigeonhole(4)
+
+# A says "B is a knave", B says "A and I are of opposite kinds": then A
+# is a knave and B a knight
+@problem('knights and knaves')
+def knights_and_knaves():
+    a = atom(model.newconst('a'))
+    b = atom(model.newconst('b'))
+    axioms = [
+        Iff(a, Not(b)),
+        Iff(b, Iff(a, Not(b))),
+    ]
+    return axioms, And(Not(a), b)
+
+# Peirce's law, and a distributive law, from nothing
+@problem('tautologies')
+def tautologies():
+    p, q, r = (atom(model.newconst(name)) for name in 'pqr')
+    return [], And(
+        Implies(Implies(Implies(p, q), p), p),
+        Iff(Or(p, And(q, r)), And(Or(p, q), Or(p, r)))
+    )
+
+# As text: <=> is looser than =>, so this is [a => b] <=> c, which with
+# a false gives c; read as a => [b <=> c], it would say nothing of c
+@problem('parsed connectives')
+def parsed_connectives():
+    names = parser.Names()
+    return [parser.parse('a => b <=> c', names = names), parser.parse('not a', names = names)], parser.parse('c', names = names)
+
+# Needs factoring: no resolvent of the two is ever shorter than its parents
+@problem('factoring')
+def factoring():
+    p = model.newconst('P')
+    x, y = model.newvar('x'), model.newvar('y')
+    axioms = [
+        forall([x, y], Or(Relation(p, Args(x)), Relation(p, Args(y)))),
+        forall([x, y], Or(Not(Relation(p, Args(x))), Not(Relation(p, Args(y))))),
+    ]
+    return axioms, atom(model.newconst('false'))
+
+'''
+SATURATING: no proof to find, so the search runs out
+'''
+@problem('group commutative', expected = False, max_given = 200)
+def group_commutative():
+    axioms, times, inverse, e, x, y = group()
+    return axioms, forall([x, y], equal(apply(times, x, y), apply(times, y, x)))
+
+# The Skolem term of z depends on x, though x only occurs in that of y,
+# so no single w does for every x; R = S = equality on two elements is a
+# counter-model
+@problem('nested existentials', expected = False, max_given = 200)
+def nested_existentials():
+    r, s = model.newconst('R'), model.newconst('S')
+    x, y, z, w = (model.newvar(name) for name in 'xyzw')
+    axioms = [Universal(x, Existential(y, Existential(z, And(Relation(r, Args(x, y)), Relation(s, Args(y, z))))))]
+    return axioms, Existential(w, Universal(x, Existential(y, And(Relation(r, Args(x, y)), Relation(s, Args(y, w))))))
+
+# P(a) only says something of the other element, whichever it is, if the
+# literal the two parents of a reduction share were dropped from it
+@problem('shared literals', expected = False, max_given = 50)
+def shared_literals():
+    names = parser.Names()
+    axioms = list(parser.formulas(['forall x. x = a or x = b; P[a];'], names = names))
+    return axioms, parser.parse('forall x. P[x]', names = names)
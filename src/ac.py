@@ -0,0 +1,356 @@
+import model
+import metrics
+import contextlib
+import itertools
+
+'''
+AC THEORIES: a functor in model.ac_operators is associative and
+commutative. Its terms are flattened into their leaves -- the arguments
+of nested applications of the same functor -- sorted, and nested to the
+right again, so terms that are equal modulo AC are the same interned
+term, and the AC axioms themselves normalize to tautologies. Normal
+forms are cached, keyed on the interned term.
+
+Unifying or matching two sums of the same functor pairs up their leaves,
+and lets a variable leaf stand for a sum of several leaves of the other
+side. Splitting a sum between two variables would take fresh variables,
+and is not tried, so AC unification here is sound but not complete. An
+equation rewrites part of a sum by extension: its side is unified with
+the whole sum plus one extra variable, which takes the rest.
+'''
+
+# Normal forms are dropped once there are this many
+CACHE_SIZE = 1 << 16
+
+# Unifiers tried per pair of terms, or all of them if None, as limiting
+# sets it
+max_unifiers = None
+
+# The extra variable of an extended equation, in a range no clause uses
+EXTENSION = -3 * model.VARIABLE_RANGE - 1
+
+caches = {}
+
+def operator(term):
+    '''
+    The AC functor at the root of term, or None.
+    '''
+    if type(term) is model.Functor and term[0] in model.symbols.ac_operators:
+        return term[0]
+    return None
+
+# The leaves of a sum, following the bindings of variables if given
+def leaves(term, op, bindings = None):
+    result = []
+    stack = [term]
+    while stack:
+        x = stack.pop()
+        if bindings is not None:
+            x = model.walk(x, bindings)
+        if type(x) is model.Functor and x[0] == op:
+            stack.extend(reversed(x.arguments))
+        else:
+            result.append(x)
+    return result
+
+# Variables first, then constants, then compound terms, by hash and, if
+# two hashes collide, by structure, so that a normal form is unique
+def order_key(term):
+    if type(term) is int:
+        return (0, -term) if term < 0 else (1, term)
+    return (2, hash(term), Tie(term))
+
+class Tie:
+    # Only compared when the hashes are the same
+    __slots__ = ('term',)
+
+    def __init__(self, term):
+        self.term = term
+
+    def __eq__(self, other):
+        return self.term is other.term
+
+    def __lt__(self, other):
+        return structure(self.term) < structure(other.term)
+
+def structure(term):
+    if type(term) is int:
+        return (0, -term) if term < 0 else (1, term)
+    return (2, type(term)._tag, term[0], tuple(structure(x) for x in term.arguments))
+
+def build(op, leaves):
+    result = leaves[-1]
+    for x in reversed(leaves[:-1]):
+        result = model.Functor(op, model.Args(x, result))
+    return result
+
+def sum_of(op, leaves):
+    return build(op, sorted(leaves, key = order_key))
+
+def normal(term, ops, cache):
+    if type(term) is int:
+        return term
+    result = cache.get(term)
+    if result is None:
+        if type(term) is model.Functor and term[0] in ops:
+            result = sum_of(term[0], [normal(x, ops, cache) for x in leaves(term, term[0])])
+        else:
+            result = type(term)(*(normal(x, ops, cache) for x in term))
+        cache[term] = result
+    return result
+
+def normalize(term):
+    ops = model.symbols.ac_operators
+    if not ops:
+        return term
+    key = frozenset(ops)
+    cache = caches.get(key)
+    if cache is None or len(cache) >= CACHE_SIZE:
+        cache = caches[key] = {}
+    return normal(term, ops, cache)
+
+def normalize_clause(clause):
+    if not model.symbols.ac_operators:
+        return clause
+    literals = [normalize(x) for x in clause]
+    if all(x is y for x, y in zip(literals, clause)):
+        return clause
+    return frozenset(literals)
+
+# An equation source = target, extended to rewrite part of a sum
+def extend(source, target, op):
+    return (
+        model.Functor(op, model.Args(source, EXTENSION)),
+        model.Functor(op, model.Args(target, EXTENSION))
+    )
+
+# The positions of the first of each distinct leaf
+def distinct(leaves):
+    seen = set()
+    for j, x in enumerate(leaves):
+        if x not in seen:
+            seen.add(x)
+            yield j
+
+def counts(leaves):
+    result = {}
+    for x in leaves:
+        result[x] = result.get(x, 0) + 1
+    return result
+
+# Every way to pick some of the leaves k times over, as the leaves
+# picked once and the rest, counting repeated leaves once
+def splits(leaves, k = 1):
+    available = counts(leaves)
+    distinct = list(available)
+    for choice in itertools.product(*(range(available[x] // k + 1) for x in distinct)):
+        if any(choice):
+            picked = [x for x, n in zip(distinct, choice) for _ in range(n)]
+            rest = [x for x, n in zip(distinct, choice) for _ in range(available[x] - k * n)]
+            yield picked, rest
+
+'''
+UNIFICATION: over triangular bindings, as in model, but yielding every
+extension of them that unifies the two terms, since there can be more
+than one.
+'''
+def unify(a, b, bindings):
+    a = model.walk(a, bindings)
+    b = model.walk(b, bindings)
+
+    if a == b:
+        yield bindings
+    elif type(a) is int and a < 0:
+        if not model.occurs(a, b, bindings):
+            yield {**bindings, a: b}
+    elif type(b) is int and b < 0:
+        if not model.occurs(b, a, bindings):
+            yield {**bindings, b: a}
+    elif type(a) is int or type(b) is int or type(a) is not type(b) or len(a) != len(b):
+        return
+    elif a.ground and b.ground:
+        # Normal forms of ground terms are only equal if identical
+        return
+    else:
+        op = operator(a)
+        if op is not None:
+            if b[0] == op:
+                yield from unify_sums(op, leaves(a, op, bindings), leaves(b, op, bindings), bindings)
+        else:
+            yield from unify_all(tuple(a), tuple(b), bindings, 0)
+
+def unify_all(xs, ys, bindings, i):
+    if i == len(xs):
+        yield bindings
+        return
+    for extended in unify(xs[i], ys[i], bindings):
+        yield from unify_all(xs, ys, extended, i + 1)
+
+def unify_sums(op, left, right, bindings):
+    # Cancel the leaves both sides share
+    right = list(right)
+    rest = []
+    for x in left:
+        if x in right:
+            right.remove(x)
+        else:
+            rest.append(x)
+    left = rest
+
+    if not left or not right:
+        if not left and not right:
+            yield bindings
+        return
+
+    def flat(xs, bindings):
+        return [y for x in xs for y in leaves(x, op, bindings)]
+
+    first, others = left[0], left[1:]
+
+    # The first leaf pairs up with one on the other side
+    for j in distinct(right):
+        for extended in unify(first, right[j], bindings):
+            yield from unify_sums(op, flat(others, extended), flat(right[:j] + right[j + 1:], extended), extended)
+
+    # ... or, if a variable, stands for a sum of several
+    if model.is_variable(first):
+        for chosen, remaining in splits(right):
+            if len(chosen) > 1:
+                value = sum_of(op, chosen)
+                if not model.occurs(first, value, bindings):
+                    extended = {**bindings, first: value}
+                    yield from unify_sums(op, flat(others, extended), flat(remaining, extended), extended)
+
+    # ... or is part of the sum a variable on the other side stands for
+    for j in distinct(right):
+        y = right[j]
+        if model.is_variable(y):
+            for chosen, remaining in splits(others):
+                value = sum_of(op, [first] + chosen)
+                if not model.occurs(y, value, bindings):
+                    extended = {**bindings, y: value}
+                    yield from unify_sums(op, flat(remaining, extended), flat(right[:j] + right[j + 1:], extended), extended)
+
+def unifiers(a, b):
+    '''
+    Unifiers of a and b modulo AC, as substitutions. Without AC functors,
+    that is just the mgu, if any.
+    '''
+    found = all_unifiers(a, b)
+    if metrics.current is not None:
+        found = metrics.current.unifications(found)
+    return found
+
+def all_unifiers(a, b):
+    if not model.symbols.ac_operators:
+        sub = model.mgu(a, b)
+        if sub is not None:
+            yield sub
+        return
+
+    seen = set()
+    for bindings in unify(a, b, {}):
+        bindings = dict(bindings)
+        sub = {x: model.resolve(x, bindings) for x in list(bindings)}
+        key = frozenset(sub.items())
+        if key not in seen:
+            seen.add(key)
+            yield sub
+            if len(seen) == max_unifiers:
+                return
+
+@contextlib.contextmanager
+def limiting(n):
+    '''
+    Give up on the unifiers of a pair of terms past the first n for the
+    duration, or on none if n is None.
+    '''
+    global max_unifiers
+    previous = max_unifiers
+    max_unifiers = n
+    try:
+        yield
+    finally:
+        max_unifiers = previous
+
+'''
+MATCHING: every extension of sub for which the pattern, substituted,
+is the term modulo AC. Variables of the term are treated as constants.
+'''
+def match(pattern, term, sub):
+    if type(pattern) is int:
+        if pattern >= 0:
+            if pattern == term:
+                yield sub
+        elif pattern not in sub:
+            yield {**sub, pattern: term}
+        elif sub[pattern] == term:
+            yield sub
+    elif pattern.ground:
+        if pattern is term:
+            yield sub
+    elif type(term) is int or type(pattern) is not type(term) or len(pattern) != len(term):
+        return
+    else:
+        op = operator(pattern)
+        if op is not None:
+            if term[0] == op:
+                # Leaves that are not variables are placed first
+                parts = sorted(leaves(pattern, op), key = model.is_variable)
+                terms = leaves(term, op)
+                if len(parts) <= len(terms):
+                    yield from match_sums(op, parts, terms, sub)
+        else:
+            yield from match_all(tuple(pattern), tuple(term), sub, 0)
+
+def match_all(patterns, terms, sub, i):
+    if i == len(patterns):
+        yield sub
+        return
+    for extended in match(patterns[i], terms[i], sub):
+        yield from match_all(patterns, terms, extended, i + 1)
+
+def match_sums(op, patterns, terms, sub):
+    if not patterns:
+        if not terms:
+            yield sub
+        return
+
+    first = patterns[0]
+    if not model.is_variable(first):
+        for j in distinct(terms):
+            for extended in match(first, terms[j], sub):
+                yield from match_sums(op, patterns[1:], terms[:j] + terms[j + 1:], extended)
+        return
+
+    # A variable that occurs k times takes the same leaves k times
+    k = patterns.count(first)
+    others = [x for x in patterns if x != first]
+    if first in sub:
+        remaining = list(terms)
+        for x in leaves(sub[first], op) * k:
+            if x not in remaining:
+                return
+            remaining.remove(x)
+        yield from match_sums(op, others, remaining, sub)
+    elif not others:
+        # The last variable takes the rest
+        available = counts(terms)
+        if terms and all(n % k == 0 for n in available.values()):
+            yield {**sub, first: sum_of(op, [x for x, n in available.items() for _ in range(n // k)])}
+    else:
+        for picked, remaining in splits(terms, k):
+            if len(remaining) >= len(others):
+                yield from match_sums(op, others, remaining, {**sub, first: sum_of(op, picked)})
+
+def matches(pattern, term):
+    '''
+    Yield matchers of pattern onto term modulo AC. Without AC functors,
+    that is just model.match, if it succeeds.
+    '''
+    if not model.symbols.ac_operators:
+        sub = model.match(pattern, term)
+        if sub is not None:
+            yield sub
+        return
+    yield from match(pattern, term, {})
@@ -0,0 +1,124 @@
+import model
+import deduction
+import os
+import pickle
+import threading
+import zlib
+
+'''
+CHECKPOINTS: the whole state of a search, written to a file every so
+many selections, so that a search killed on the way can be carried on
+from the last one, in this process or another, as if it had never
+stopped.
+
+The state is the session, pickled between two selections: the passive
+set with its unbuilt reductions, the clause store, the derivation log,
+the canon with its indices, rules and congruence closure, and the symbol
+table the problem is stated in. Terms are pickled as their items, and
+interned again when loaded. Only the pickling holds up the search; the
+compression and the writing are left to a thread, and the file is only
+replaced once the new snapshot is whole.
+
+h, the scorer, the ordering and the selection are pickled along, so
+have to be picklable, as functions defined at the top of a module are.
+Processes and metrics are not kept, but given again on resuming.
+'''
+
+# The start of every checkpoint, and of no other file
+FORMAT = b'prover checkpoint 1\n'
+
+# For resume: as many selections as the search had left
+LEFT = -1
+
+class Checkpoint:
+    def __init__(self, path, every = 100, level = 1):
+        '''
+        Write to path every so many selections, compressed by zlib at
+        level.
+        '''
+        self.path = path
+        self.every = every
+        self.level = level
+        self.given = 0
+        self.writer = None
+        self.error = None
+
+    # One more selection; the search is left over at this point with
+    # max_given more to go, or no limit if None
+    def select(self, session, max_given):
+        self.given += 1
+        if self.every and self.given % self.every == 0:
+            self.save(session, max_given)
+
+    def save(self, session, max_given = None):
+        with session.metrics.timer('checkpoint'):
+            data = pickle.dumps((session, max_given), pickle.HIGHEST_PROTOCOL)
+        session.metrics.count('checkpoint')
+        self.wait()
+        self.writer = threading.Thread(target = self.write, args = (data,))
+        self.writer.start()
+
+    def write(self, data):
+        temporary = self.path + '.tmp'
+        try:
+            with open(temporary, 'wb') as file:
+                file.write(FORMAT)
+                file.write(zlib.compress(data, self.level))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, self.path)
+        except Exception as error:
+            self.error = error
+
+    # Wait for the snapshot being written, if any, and raise what went
+    # wrong writing it
+    def wait(self):
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+def adopt(table):
+    '''
+    Add the symbols of table to the table in scope, with how they are
+    rendered and which are AC.
+    '''
+    model.symbols.constants.update(table.constants)
+    model.symbols.variables.update(table.variables)
+    model.symbols.render_prefs.update(table.render_prefs)
+    model.symbols.ac_operators.update(table.ac_operators)
+
+def load(path):
+    '''
+    The session saved in a checkpoint, with its symbols added to the
+    table in scope, which should be new, and the number of selections it
+    had left, or None.
+    '''
+    with open(path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(FORMAT):
+        raise ValueError('%s is not a checkpoint' % (path,))
+    session, max_given = pickle.loads(zlib.decompress(data[len(FORMAT):]))
+    adopt(session.symbols)
+    session.symbols = model.symbols
+    return session, max_given
+
+def resume(path, max_given = LEFT, workers = None, metrics = None, checkpoint = None):
+    '''
+    Carry on with the search saved in a checkpoint, as find_contradiction
+    would have: returns the proof map of the contradiction, or None. It
+    stops after the selections the search had left, unless max_given is
+    given. Reductions are spread over workers processes, metrics are
+    collected and checkpoints written as find_contradiction's options
+    say.
+    '''
+    session, left = load(path)
+    session.metrics = deduction.SILENT if metrics is None else metrics
+    session.checkpoint = checkpoint
+    session.spawn(workers)
+    try:
+        return session.saturate(left if max_given == LEFT else max_given)
+    finally:
+        session.close()
@@ -0,0 +1,239 @@
+import model
+import index
+
+'''
+CONGRUENCE CLOSURE: the ground unit equalities of the canon, closed under
+congruence in an E-graph. Every ground term the equalities mention is a
+node, nodes are kept in classes by union-find, and a signature table --
+the functor and the classes of the arguments -- finds the terms that
+become congruent when two classes merge, which merge in turn.
+
+Each merge is also an edge of a proof forest, labelled with the id of
+the equality that caused it or, for a congruence, nothing. The path
+between two terms of a class, with the congruences along it explained
+in turn by their arguments, gives the ids of the equalities that make
+the two terms equal.
+
+Ground unit disequalities are kept as well, and reported as soon as a
+merge puts both their sides in one class. Sums of AC functors are taken
+in normal form, as plain terms, so the closure knows nothing of AC.
+'''
+
+def ground_equation(literal):
+    '''
+    The sides of a literal that is a ground equality, or None.
+    '''
+    if index.is_equality(literal) and literal.ground:
+        return literal.arguments
+    return None
+
+class Closure:
+    def __init__(self):
+        # Union-find over terms, and the size of each class
+        self.parent = {}
+        self.size = {}
+        # The compound terms with an argument in each class, by class
+        self.uses = {}
+        self.signatures = {}
+        # The proof forest, as term -> (term, id of the equality or None)
+        self.edges = {}
+        # (one side, other side, id) of each disequality
+        self.disequalities = []
+
+    def copy(self):
+        result = Closure()
+        result.parent = dict(self.parent)
+        result.size = dict(self.size)
+        result.uses = {x: list(terms) for x, terms in self.uses.items()}
+        result.signatures = dict(self.signatures)
+        result.edges = dict(self.edges)
+        result.disequalities = list(self.disequalities)
+        return result
+
+    def find(self, term):
+        root = term
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[term] != root:
+            self.parent[term], term = root, self.parent[term]
+        return root
+
+    def signature(self, term):
+        return term[0], tuple(self.find(x) for x in term.arguments)
+
+    # Add a term and its subterms as nodes, with the merges that causes
+    def add(self, term, pending):
+        if term in self.parent:
+            return
+        self.parent[term] = term
+        self.size[term] = 1
+        if type(term) is not model.Functor:
+            return
+        for x in term.arguments:
+            self.add(x, pending)
+            self.uses.setdefault(self.find(x), []).append(term)
+        signature = self.signature(term)
+        if signature in self.signatures:
+            pending.append((term, self.signatures[signature], None))
+        else:
+            self.signatures[signature] = term
+
+    # The class of a term, without adding it, or None if it has its own
+    def lookup(self, term):
+        if term in self.parent:
+            return self.find(term)
+        if type(term) is not model.Functor:
+            return None
+        classes = []
+        for x in term.arguments:
+            c = self.lookup(x)
+            if c is None:
+                return None
+            classes.append(c)
+        other = self.signatures.get((term[0], tuple(classes)))
+        return None if other is None else self.find(other)
+
+    def equal(self, a, b):
+        return a == b or (self.lookup(a) is not None and self.lookup(a) == self.lookup(b))
+
+    # Make x the root of its tree in the proof forest
+    def reroot(self, x):
+        edge = self.edges.pop(x, None)
+        while edge is not None:
+            y, reason = edge
+            edge = self.edges.get(y)
+            self.edges[y] = (x, reason)
+            x = y
+
+    def insert(self, *terms):
+        pending = []
+        for x in terms:
+            self.add(x, pending)
+        self.close(pending)
+
+    def merge(self, a, b, reason):
+        '''
+        Merge the classes of ground terms a and b, as equality reason
+        says they are equal, and everything that makes congruent.
+        '''
+        self.insert(a, b)
+        self.close([(a, b, reason)])
+
+    # Merge each pending (a, b, reason), and the merges that causes
+    def close(self, pending):
+        while pending:
+            a, b, reason = pending.pop()
+            ra, rb = self.find(a), self.find(b)
+            if ra == rb:
+                continue
+            # The smaller class joins the larger
+            if self.size[ra] > self.size[rb]:
+                a, b, ra, rb = b, a, rb, ra
+            self.reroot(a)
+            self.edges[a] = (b, reason)
+            self.parent[ra] = rb
+            self.size[rb] += self.size[ra]
+
+            uses = self.uses.setdefault(rb, [])
+            for term in self.uses.pop(ra, ()):
+                signature = self.signature(term)
+                other = self.signatures.setdefault(signature, term)
+                if other != term and self.find(other) != self.find(term):
+                    pending.append((term, other, None))
+                uses.append(term)
+
+    def distinguish(self, a, b, reason):
+        '''
+        Note that ground terms a and b are unequal, as disequality
+        reason says.
+        '''
+        self.insert(a, b)
+        self.disequalities.append((a, b, reason))
+
+    def contradictions(self):
+        '''
+        Yield (id of a disequality, ids of the equalities) for every
+        disequality whose sides are now in one class.
+        '''
+        for a, b, reason in self.disequalities:
+            if self.find(a) == self.find(b):
+                yield reason, self.explain(a, b)
+
+    # The edges between two terms of a class in the proof forest
+    def path(self, a, b):
+        chain = [a]
+        while chain[-1] in self.edges:
+            chain.append(self.edges[chain[-1]][0])
+        depth = {x: k for k, x in enumerate(chain)}
+
+        result = []
+        while b not in depth:
+            c, reason = self.edges[b]
+            result.append((b, c, reason))
+            b = c
+        for x in chain[:depth[b]]:
+            result.append((x,) + self.edges[x])
+        return result
+
+    def explain(self, a, b):
+        '''
+        The ids of the equalities that make a and b, of one class, equal.
+        '''
+        result = set()
+        seen = set()
+        pending = [(a, b)]
+        while pending:
+            a, b = pending.pop()
+            if a == b or (a, b) in seen:
+                continue
+            seen.add((a, b))
+            for x, y, reason in self.path(a, b):
+                if reason is None:
+                    pending.extend(zip(x.arguments, y.arguments))
+                else:
+                    result.add(reason)
+        return sorted(result)
+
+    def add_clause(self, clause, i):
+        '''
+        Take in statement i, if it is a ground unit equality or
+        disequality; True if it is.
+        '''
+        if len(clause) != 1:
+            return False
+        literal = next(iter(clause))
+        negated = type(literal) is model.Not
+        sides = ground_equation(literal.body if negated else literal)
+        if sides is None:
+            return False
+        (self.distinguish if negated else self.merge)(*sides, i)
+        return True
+
+    def entails(self, clause):
+        '''
+        Whether some ground equality of the clause holds already.
+        '''
+        for literal in clause:
+            sides = ground_equation(literal)
+            if sides is not None and self.equal(*sides):
+                return True
+        return False
+
+    def simplify(self, clause):
+        '''
+        Drop the ground disequalities of the clause that the closure
+        refutes. Returns the simplified clause and the ids of the
+        equalities used, which are empty if nothing changed.
+        '''
+        literals = []
+        reasons = set()
+        for literal in clause:
+            sides = ground_equation(literal.body) if type(literal) is model.Not else None
+            if sides is not None and self.equal(*sides):
+                self.insert(*sides)
+                reasons.update(self.explain(*sides))
+            else:
+                literals.append(literal)
+        if not reasons:
+            return clause, []
+        return frozenset(literals), sorted(reasons)
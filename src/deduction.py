@@ -1,29 +1,46 @@
 import model
-import heapq
+import index
+import subsumption
+import math
+import passive
+import orderings
+import superposition
+import rewrite
+import parallel
+import flatterm
+import variants
+import ac
+import congruence
+import scoring
+import selection
+import metrics
 import sys
+import warnings
 sys.setrecursionlimit(5000)
 
 DEBUG = False
 
+# The metrics of a search no one is measuring, under a name the metrics
+# option of a Session does not hide
+SILENT = metrics.SILENT
+
 def debug_print(*args):
     if DEBUG:
         print(*args)
 
+# Only to a terminal, and only when no one is collecting metrics instead
 def progress_log(*args):
     if DEBUG:
         print(*args)
-    else:
+    elif metrics.current is None and sys.stdout.isatty():
         print(*args, end='\033[K\r', flush=True)
 
 # Paramodulate with a specific source and target
 def paramodulate_with(term, source, target):
     # If the source matches the entire term, we can replace.
-    # We cannot paramodulate into an Args object.
-    if (type(term) is not model.Args and
-          type(term) is not model.Relation and type(target) is not model.Relation):
-      mgu = model.mgu(term, source)
-
-      if mgu is not None:
+    # We cannot paramodulate into an Args object, a Relation or a negation.
+    if (type(term) is int or type(term) is model.Functor) and type(target) is not model.Relation:
+      for mgu in ac.unifiers(term, source):
           debug_print('I can substitute', model.render_tree(term), model.render_tree(source), model.render_tree(target), mgu)
           yield target, mgu, (source, target)
 
@@ -31,13 +48,15 @@ def paramodulate_with(term, source, target):
         return
 
     # We can also match any subterm, and
-    # replace only that subterm
-    for subterm in term:
-        #if ((type(term) is model.Functor and term is term.functor) or
-        #        (type(term) is model.Relation and term is term.relation)):
-        #    continue
+    # replace only that subterm, but never the symbol of a Functor or Relation
+    if type(term) is model.Functor or type(term) is model.Relation:
+        for submodulation, mgu, note in paramodulate_with(term.arguments, source, target):
+            yield type(term)(term[0], submodulation), mgu, note
+        return
+
+    for i, subterm in enumerate(term):
         for submodulation, mgu, note in paramodulate_with(subterm, source, target):
-            yield type(term)(*(submodulation if x is subterm else x for x in term)), mgu, note
+            yield type(term)(*(submodulation if j == i else x for j, x in enumerate(term))), mgu, note
 
 def paramodulate(term_a, term_b):
     # Attempt paramodulations. 0 is the equality relation.
@@ -50,12 +69,31 @@ def paramodulate(term_a, term_b):
         yield from paramodulate_with(term_a, term_b.arguments[1], term_b.arguments[0])
 
 # Get all possible binary reductions as well as paramodulations
-# of two disjunctions
-def reductions(a, b):
-    b = model.uniquify(b)
+# of two disjunctions, as (literals, unifier, note): the reduction
+# is the literals, substituted by the unifier. If pairs is given,
+# only those (literal of a, literal of b) pairs are tried. Given a
+# selection function, a clause with a selected literal only takes
+# part through it.
+def inferences(a, b, pairs = None, selection = None):
+    renaming = model.renaming(b)
+    renamed = {model.substitute(term_b, renaming): term_b for term_b in b}
+    selected_a = selected_b = None
+    if selection is not None:
+        selected_a = selection(a)
+        selected_b = selection(b)
+        if selected_b is not None:
+            selected_b = model.substitute(selected_b, renaming)
+    b = frozenset(renamed)
 
     for term_a in a:
+        if selected_a is not None and term_a is not selected_a:
+            continue
         for term_b in b:
+            if pairs is not None and (term_a, renamed[term_b]) not in pairs:
+                continue
+            if selected_b is not None and term_b is not selected_b:
+                continue
+
             # Attempt a binary reduction.
             if (type(term_a) is model.Not) != (type(term_b) is model.Not):
               # If only one is negated, figure out which one and continue
@@ -70,82 +108,819 @@ def reductions(a, b):
                   print(model.render_tree(pos_term))
                   raise 'ERROR!'
 
-              # Get mgu
-              mgu = model.mgu(neg_term.body, pos_term)
-
-              # If they possibly match, yield the match
-              if mgu is not None:
+              # Get unifiers
+              for mgu in ac.unifiers(neg_term.body, pos_term):
                   debug_print('yielding from binary reduction')
-                  yield model.sub_all((a | b - {neg_term, pos_term}), mgu), ('reduction', pos_term)
+                  # Each literal only leaves its own clause: one both share stays
+                  yield (a - {term_a}) | (b - {term_b}), mgu, ('reduction', pos_term)
 
             # Attempt paramodulations
             for paramodulated_term, mgu, note in paramodulate(term_a, term_b):
-                yield model.sub_all(((a | b) - {term_a, term_b}) | {paramodulated_term}, mgu), ('paramodulation', (note[0], note[1], mgu))
+                yield (a - {term_a}) | (b - {term_b}) | {paramodulated_term}, mgu, ('paramodulation', (note[0], note[1], mgu))
         debug_print('done with some terms')
     debug_print('done with these disjunctions')
 
-def find_contradiction(cnf, h, max_cost = 1000):
-    debug_print(model.render_cnf(cnf))
-
-    # Frontier -- the things not yet canonicalized
-    # but which are true.
-    frontier = []
-    proof_map = {x: None for x in cnf}
-    cost_map = {x: 0 for x in cnf}
-    def push(x, a, b, note):
-        if x not in cnf:
-            debug_print('pushing', model.render_cnf({x}))
-            if x in cost_map or x in proof_map:
-                return
-            cost_map[x] = h(x, a, b) + max(cost_map[a], cost_map[b]) + 1
-            proof_map[x] = (a, b, note)
-        heapq.heappush(frontier, (cost_map[x], x))
-
-    pop = lambda: heapq.heappop(frontier)
-
-    # The canon of deductions we have made so far
-    canon = set()
-    ordered_canon = []
-
-    # The initial frontier contains all the axioms
-    for axiom in cnf:
-        push(model.canon(axiom), None, None, None)
-
-    # Keep generating new deductions
-    while frozenset() not in canon:
-        cost, new_statement = pop()
-
-        if cost > max_cost:
+# The same, with the reductions built
+def reductions(a, b, pairs = None, selection = None):
+    for literals, mgu, note in inferences(a, b, pairs, selection):
+        yield model.sub_all(literals, mgu), note
+
+# The binary reductions of a negative literal of a nucleus with the
+# positive literals of an electron, just as inferences gives them, but
+# only with those that are maximal in the electron by ordering
+def resolutions(nucleus, literal, electron, ordering):
+    renaming = model.renaming(electron)
+    electron = frozenset(model.substitute(x, renaming) for x in electron)
+    for positive in electron:
+        for mgu in ac.unifiers(literal.body, positive):
+            if ordering.maximal(positive, electron, mgu):
+                yield (nucleus - {literal}) | (electron - {positive}), mgu, ('reduction', positive)
+
+# Whether a literal, substituted by sub, is a negated equality of a
+# term with itself, which the canonical form of its clause leaves out
+def antireflexive(literal, sub):
+    if type(literal) is not model.Not or not index.is_equality(literal.body):
+        return False
+    s, t = (ac.normalize(model.substitute(x, sub)) for x in literal.body.arguments)
+    return s == t
+
+class Inference:
+    '''
+    A reduction waiting in the passive set to be built: its literals,
+    before the unifier is applied, its parents by id, and its note.
+    '''
+    __slots__ = ('literals', 'unifier', 'a', 'b', 'note')
+
+    def __init__(self, literals, unifier, a, b, note):
+        self.literals = literals
+        self.unifier = unifier
+        self.a = a
+        self.b = b
+        self.note = note
+
+# Superposition, unless the set of support needs the unrestricted
+# calculus to be complete
+def default_calculus(calculus, set_of_support):
+    if calculus is None:
+        return 'unrestricted' if set_of_support else 'superposition'
+    if set_of_support and calculus != 'unrestricted':
+        warnings.warn('a set of support is incomplete with %s' % (calculus,), stacklevel = 3)
+    return calculus
+
+class Session:
+    '''
+    A saturation that lasts: the passive set, the canon with its indices
+    and the record of how everything was derived, kept from one goal to
+    the next so that the consequences of the axioms are only found once.
+
+    Goals are refuted against it with a set of support: the negated goal
+    and everything derived from it are kept apart, and forgotten once the
+    search is over. They never subsume or rewrite a statement that
+    does not descend from the goal, so what is left is exactly what the
+    axioms alone would have given.
+
+    Every statement is kept in a clause store, by id, only as its
+    flatterm, and the records of the search refer to ids. Only the
+    statements in the indices are kept as trees.
+
+    Unless h is given, which needs a statement built to cost it,
+    reductions other than units wait in the passive set unbuilt, as
+    Inferences, at the cost the scorer will give them, which the
+    unifier tells without applying it. Most are never selected, and so
+    never built, simplified or stored; the rest are built when they
+    are, and selected in their place.
+
+    The options are those of find_contradiction, and symbols is the
+    table the goals are stated in, the one in scope unless given.
+    Metrics, if given, are collected over every saturation, and a
+    checkpoint, if given, is written to as it goes. Goals are looked up
+    in library, a lemmas.Library, if given, and their proofs kept there.
+    '''
+    def __init__(self, axioms = (), h = None, max_cost = 1000, goal = frozenset(),
+            ratio = passive.DEFAULT_RATIO, calculus = None, ordering = None,
+            demodulate = True, closure = True, lazy = True, workers = None, symbols = None,
+            scorer = None, metrics = None, set_of_support = False, selection = None,
+            checkpoint = None, library = None, max_unifiers = None):
+        self.symbols = model.symbols if symbols is None else symbols
+        self.metrics = SILENT if metrics is None else metrics
+        self.checkpoint = checkpoint
+        self.library = library
+        self.h = h
+        self.scorer = scoring.Scorer() if scorer is None else scorer
+        self.max_cost = max_cost
+        self.calculus = default_calculus(calculus, set_of_support)
+        self.ordering = orderings.KBO() if ordering is None else ordering
+        self.set_of_support = set_of_support
+        # Hyperresolution picks its own literals
+        self.selection = None if self.calculus == 'hyperresolution' else selection
+        self.lazy = lazy and h is None
+        self.max_unifiers = max_unifiers
+
+        self.variants = variants.Canonicalizer()
+        self.store = flatterm.ClauseStore(self.variants)
+
+        # The passive set -- the things not yet canonicalized
+        # but which are true.
+        self.passive_set = passive.PassiveSet(ratio)
+        # By id: how each statement was derived, its cost, and
+        # how many reductions away from the negated goal it is
+        self.derivations = flatterm.DerivationLog()
+        self.cost_map = {}
+        self.distance_map = {}
+
+        # The canon of deductions we have made so far, by id, and
+        # the trees of those in the indices, so that the partners of
+        # a new statement can be looked up. Statements that become
+        # subsumed are retired from the indices but stay in the canon,
+        # so that they are never selected again.
+        self.canon = set()
+        self.active = {}
+        self.active_ids = {}
+        self.position = {}
+        self.positions = 0
+        self.canon_index = index.ClauseIndex()
+        self.subsumption_index = subsumption.SubsumptionIndex()
+        self.demodulator = rewrite.Demodulator(self.ordering) if demodulate else None
+        self.closure = congruence.Closure() if closure else None
+
+        # While a goal is being refuted: the ids of everything that
+        # descends from it, the trees of those in the indices, and the
+        # rules and congruence closure of the canon including its own
+        self.support = set()
+        self.goal_statements = set()
+        # Statements stored before the goal, but never searched, that it
+        # brought back, with how each was derived, its cost and distance
+        self.requeued = {}
+        self.goal_demodulator = None
+        self.goal_closure = None
+
+        self.pool = None
+        self.spawn(workers)
+
+        # The axioms, in normal form, for the library
+        self.axioms = set()
+
+        self.add(axioms, goal)
+
+    # Spread reductions over that many processes, if more than one
+    def spawn(self, workers):
+        if workers is not None and workers > 1 and self.calculus != 'hyperresolution':
+            self.pool = parallel.Pool(workers, self.calculus, self.ordering, self.symbols.ac_operators, self.selection, self.max_unifiers)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        if self.checkpoint is not None:
+            self.checkpoint.wait()
+
+    # A checkpoint keeps everything but the processes, the metrics, the
+    # library and the checkpoint itself, which are given again, if need
+    # be, on resuming
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(pool = None, metrics = None, checkpoint = None, library = None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.metrics = SILENT
+
+    def infer(self, a, b, pairs):
+        if self.calculus == 'superposition':
+            return superposition.inferences(a, b, self.ordering, pairs, self.selection)
+        return inferences(a, b, pairs, self.selection)
+
+    def add(self, statements, goal = ()):
+        '''
+        Add statements as axioms. Those also in goal count as the
+        negated goal when ordering the 'goal' queue. Tautologies, like
+        the axioms of the AC functors, are left out.
+        '''
+        goal = set(self.normal(x) for x in goal)
+        for x in set(self.normal(x) for x in statements):
+            if not rewrite.is_tautology(x):
+                self.axioms.add(x)
+                self.assume(x, 0 if x in goal else math.inf)
+
+    def assume(self, x, distance):
+        debug_print('assuming', model.render_cnf({x}))
+        i = self.store.add(x)
+        self.derivations.assume(i)
+        self.cost_map[i] = 0
+        self.distance_map[i] = distance
+        self.passive_set.push(i, weight = 0, goal = (distance, 0))
+        return i
+
+    # The canonical form of a new statement, with its sums in normal form
+    def normal(self, x):
+        with self.metrics.timer('canon'):
+            return ac.normalize_clause(self.variants.canon(ac.normalize_clause(x))[0])
+
+    def statement(self, i):
+        return self.active[i] if i in self.active else self.store.clause(i)
+
+    # Does a statement with parents a and b, by id, descend from the goal?
+    # The equalities a congruence note refers to count as parents too.
+    def tainted(self, a, b, note = None):
+        rules = note[1] if note is not None and note[0] == 'congruence' else ()
+        return any(p in self.support for p in (a, b, *rules))
+
+    # Record x as derived from a and b, by id, and return its own id.
+    # b is None for a statement simplified from a alone.
+    def record(self, x, a, b, note, located = None):
+        i = self.store.add(x, located)
+        parents = [p for p in (a, b) if p is not None]
+        with self.metrics.timer('cost'):
+            if self.h is None:
+                cost = self.scorer.score(x)
+            else:
+                cost = self.h(x, *(None if p is None else self.statement(p) for p in (a, b)))
+        self.cost_map[i] = cost + max(self.cost_map[p] for p in parents) + 1
+        # The rules of a demodulation are all in the canon
+        kind, payload = note
+        if kind == 'demodulation':
+            used = [self.active_ids[rule] for rule, _, _, _ in payload]
+        else:
+            used = payload if kind == 'congruence' else ()
+        self.derivations.add(i, a, b, kind, used)
+        self.distance_map[i] = min(self.distance_map[p] for p in parents) + 1
+
+        if self.tainted(a, b, note):
+            self.support.add(i)
+        elif i in self.support:
+            # Found before from the goal, and now without it: it has to
+            # be selected again, so that what it leads to is kept too
+            self.support.discard(i)
+            if i in self.active:
+                self.retire(i)
+            self.canon.discard(i)
+        return i
+
+    # Record a new statement and, unless told not to, push it to the
+    # passive set. Returns its id, or None if it is not worth keeping.
+    def push(self, x, a, b, note, queue = True):
+        debug_print('pushing', model.render_cnf({x}))
+        tainted = self.tainted(a, b, note)
+        located = self.store.locate(x)
+        i = located[1]
+        if i is not None and (tainted or i not in self.support):
+            self.metrics.count('variant')
+            return None
+        # Forward subsumption: drop anything the canon already covers
+        if self.subsumer(x, tainted) is not None:
+            self.metrics.count('forward subsumption')
             return None
+        i = self.record(x, a, b, note, located)
 
-        if new_statement in canon:
-            continue
+        # Nothing over the budget will ever be selected
+        if self.cost_map[i] > self.max_cost:
+            self.metrics.count('over budget')
+            return None
+        if queue:
+            self.passive_set.push(i, weight = self.cost_map[i], goal = (self.distance_map[i], self.cost_map[i]))
+        return i
+
+    # Push reductions unbuilt, as (the literals they will keep, Inference),
+    # at the costs record would give them, scored all at once
+    def defer(self, batch):
+        with self.metrics.timer('cost'):
+            rows = [scoring.features(kept, inference.unifier) for kept, inference in batch]
+            scores = self.scorer.scores(rows)
+        for (_, inference), score in zip(batch, scores):
+            a, b = inference.a, inference.b
+            cost = score + max(self.cost_map[a], self.cost_map[b]) + 1
+            if cost <= self.max_cost:
+                distance = min(self.distance_map[a], self.distance_map[b]) + 1
+                self.passive_set.push(inference, weight = cost, goal = (distance, cost))
+                self.metrics.count('deferred')
+            else:
+                self.metrics.count('over budget')
+
+    # Build a reduction that has been selected, to be selected in its
+    # place. Returns its id, or None if it is not worth keeping.
+    def build(self, inference):
+        # Its parents may have been forgotten with the goal they came from
+        if inference.a not in self.store or inference.b not in self.store:
+            return None
+        self.metrics.count('built')
+        x = self.normal(model.sub_all(inference.literals, inference.unifier))
+        simplified = self.simplify(x, inference.a, inference.b, inference.note)
+        return None if simplified is None else self.push(*simplified, queue = False)
+
+    def rules(self, tainted):
+        # Only the goal's statements are rewritten by the goal's rules
+        if tainted and self.goal_demodulator is not None:
+            return self.goal_demodulator
+        return self.demodulator
+
+    def congruence(self, tainted):
+        if tainted and self.goal_closure is not None:
+            return self.goal_closure
+        return self.closure
+
+    # Each simplification of x in turn, as (simplified, note)
+    def simplifications(self, x, tainted):
+        demodulator = self.rules(tainted)
+        if demodulator is not None:
+            normal, steps = demodulator.normalize(x)
+            if steps:
+                x = self.normal(normal)
+                yield x, ('demodulation', steps)
+
+        closure = self.congruence(tainted)
+        if closure is not None:
+            simplified, rules = closure.simplify(x)
+            if rules:
+                yield self.normal(simplified), ('congruence', rules)
+
+    # Does a ground equality of x already hold?
+    def entailed(self, x, tainted):
+        closure = self.congruence(tainted)
+        return closure is not None and closure.entails(x)
+
+    # A statement of the canon that subsumes x, or None. The goal's
+    # statements only subsume what descends from the goal.
+    def subsumer(self, x, tainted):
+        with self.metrics.timer('subsumption'):
+            return self.subsumption_index.subsumer(x, () if tainted else self.goal_statements)
+
+    def retire(self, i):
+        statement = self.active.pop(i)
+        del self.active_ids[statement]
+        debug_print('retiring', model.render_cnf({statement}))
+        self.canon_index.remove(statement)
+        self.subsumption_index.remove(statement)
+        self.goal_statements.discard(statement)
+        for demodulator in (self.demodulator, self.goal_demodulator):
+            if demodulator is not None:
+                demodulator.remove(statement)
+        if self.pool is not None:
+            self.pool.forget(statement)
+
+    # Simplify a new deduction, recording each unsimplified one
+    # as a step of the proof. Returns the simplified deduction,
+    # with its parents and note, or None if it is not worth
+    # keeping. A statement already recorded as this is simplified
+    # again, and keeps its record.
+    def simplify(self, x, a, b, note, this = None):
+        tainted = self.tainted(a, b, note) if this is None else this in self.support
+
+        simplified = False
+        for normal, simplification in self.metrics.timed('simplify', self.simplifications(x, tainted)):
+            self.metrics.count(simplification[0])
+            if simplified or this is None:
+                located = self.store.locate(x)
+                this = located[1]
+                if this is None or (this in self.support and not tainted):
+                    this = self.record(x, a, b, note, located)
+            x, a, b, note = normal, this, None, simplification
+            simplified = True
+        if not simplified and this is not None:
+            return None
+
+        if rewrite.is_tautology(x):
+            self.metrics.count('tautology')
+            return None
+        if self.entailed(x, tainted):
+            self.metrics.count('entailed')
+            return None
+        return x, a, b, note
 
-        progress_log('[%s] [%s] %s' % (len(canon), cost, model.render_cnf({new_statement}),))
-        canon.add(new_statement)
-        ordered_canon.append(new_statement)
+    # Simplify a new deduction and push it. True if it is the contradiction.
+    def derive(self, x, a, b, note, this = None):
+        simplified = self.simplify(x, a, b, note, this)
+        if simplified is None:
+            return False
+        self.push(*simplified)
+        return len(simplified[0]) == 0
 
-        for statement in ordered_canon:
-            debug_print('reducing with next statement', model.render_cnf({statement}))
-            for reduction, note in reductions(statement, new_statement):
-                reduction = model.canon(reduction)
-                push(reduction, statement, new_statement, note)
+    # Does statement i descend from the negated goal?
+    def supported(self, i):
+        return self.distance_map[i] < math.inf
 
-                # Return should happen from here
-                if len(reduction) == 0:
-                    debug_print('I AM DONE!')
-                    return proof_map
+    # Everything new statement i reduces to, as (id of each parent,
+    # literals, unifier, note)
+    def inferences(self, i, new_statement):
+        partners = self.canon_index.partners(new_statement)
+        # Partners may be retired while their reductions are derived
+        ids = {x: self.active_ids[x] for x in partners}
+        # With a set of support, statements from the axioms alone are
+        # never reduced with each other
+        alone = self.set_of_support and not self.supported(i)
+        if alone:
+            partners = {x: pairs for x, pairs in partners.items() if self.supported(ids[x])}
+        ordered = sorted(partners, key = lambda x: self.position[ids[x]])
+        if self.calculus == 'hyperresolution':
+            yield from self.hyperresolutions(i, new_statement, [(ids[x], x, partners[x]) for x in ordered])
+        elif self.pool is not None and len(ordered) >= parallel.MIN_BATCH:
+            for statement, reduction, note in self.pool.inferences(new_statement, [(x, partners[x]) for x in ordered]):
+                yield ids[statement], i, reduction, {}, note
+        else:
+            for statement in ordered:
+                debug_print('reducing with next statement', model.render_cnf({statement}))
+                for literals, unifier, note in self.infer(statement, new_statement, partners[statement]):
+                    yield ids[statement], i, literals, unifier, note
 
+        if alone:
+            return
+        if self.calculus == 'superposition':
+            for literals, unifier, note in superposition.equality_resolutions(new_statement, self.ordering, self.selection):
+                yield i, i, literals, unifier, note
+            for literals, unifier, note in superposition.equality_factorings(new_statement, self.ordering, self.selection):
+                yield i, i, literals, unifier, note
+        for literals, unifier, note in superposition.factorings(new_statement, self.factoring_ordering(), self.selection):
+            yield i, i, literals, unifier, note
+
+    # Only superposition factors by the ordering; the other calculi
+    # factor any two literals
+    def factoring_ordering(self):
+        return self.ordering if self.calculus == 'superposition' else None
+
+    # Hyperresolution: a nucleus, a clause with negative literals, is
+    # reduced with electrons, positive clauses of the canon, one negative
+    # literal after another until it is positive itself, each time with
+    # a literal of the electron that is maximal by the ordering. A new electron
+    # takes any negative literal of a nucleus in the canon, and the rest
+    # are taken in the order selection.negative picks them. Each step is
+    # a binary reduction, and all but the last are recorded but never
+    # queued. Paramodulation is as in the unrestricted calculus.
+    def hyperresolutions(self, i, new_statement, partners):
+        electron = selection.positive(new_statement)
+        first = None if electron else selection.negative(new_statement)
+        for j, statement, pairs in partners:
+            for literals, unifier, note in inferences(statement, new_statement, pairs):
+                if note[0] == 'paramodulation':
+                    yield j, i, literals, unifier, note
+
+            if electron and not selection.positive(statement):
+                nuclei = set(x for x, _ in pairs if type(x) is model.Not)
+                for literal in sorted(nuclei, key = hash):
+                    yield from self.hyperresolve(j, statement, literal, i, new_statement)
+            elif not electron and selection.positive(statement):
+                if any(x is first for _, x in pairs):
+                    yield from self.hyperresolve(i, new_statement, first, j, statement)
+
+    # Reduce a nucleus with an electron, by id, on one literal, and what
+    # is left with the electrons of the canon
+    def hyperresolve(self, a, nucleus, literal, b, electron):
+        for literals, unifier, note in resolutions(nucleus, literal, electron, self.ordering):
+            if all(type(x) is not model.Not or antireflexive(x, unifier) for x in literals):
+                yield a, b, literals, unifier, note
+                continue
+
+            x = self.normal(model.sub_all(literals, unifier))
+            if rewrite.is_tautology(x):
+                continue
+            located = self.store.locate(x)
+            k = located[1]
+            if k is None or (k in self.support and not self.tainted(a, b)):
+                k = self.record(x, a, b, note, located)
+            self.metrics.count('intermediate')
+
+            rest = selection.negative(x)
+            for statement, pairs in self.canon_index.partners(x).items():
+                if selection.positive(statement) and any(y is rest for _, y in pairs):
+                    yield from self.hyperresolve(k, x, rest, self.active_ids[statement], statement)
+
+    # Select statement i into the canon. True if that gives the contradiction.
+    def select(self, i, new_statement):
+        tainted = i in self.support
+
+        progress_log('[%s] [%s] %s' % (len(self.canon), self.cost_map[i], model.render_cnf({new_statement}),))
+        self.canon.add(i)
+        self.position[i] = self.positions
+        self.positions += 1
+
+        # Backward subsumption: retire whatever the new statement covers
+        with self.metrics.timer('subsumption'):
+            subsumed = list(self.subsumption_index.subsumed(new_statement))
+        for statement in subsumed:
+            j = self.active_ids[statement]
+            if not tainted or j in self.support:
+                self.metrics.count('backward subsumption')
+                self.retire(j)
+
+        self.active[i] = new_statement
+        self.active_ids[new_statement] = i
+        if tainted:
+            self.goal_statements.add(new_statement)
+        self.canon_index.add(new_statement)
+        self.subsumption_index.add(new_statement)
+
+        # Backward demodulation: whatever a new rule rewrites is retired,
+        # and goes back through the passive set in normal form
+        demodulator = self.rules(tainted)
+        if demodulator is not None:
+            if not tainted and self.goal_demodulator is not None:
+                self.goal_demodulator.add(new_statement)
+            if demodulator.add(new_statement):
+                rewritable = [self.active_ids[x] for x in demodulator.rewritable(self.canon_index, new_statement)]
+                for j in sorted(rewritable, key = self.position.__getitem__):
+                    if j in self.active and (not tainted or j in self.support):
+                        statement = self.active[j]
+                        self.metrics.count('backward demodulation')
+                        self.retire(j)
+                        if self.derive(statement, None, None, None, j):
+                            return True
+
+        # Ground unit equalities join the congruence closure, which may
+        # then refute a disequality outright
+        closure = self.congruence(tainted)
+        if closure is not None:
+            if not tainted and self.goal_closure is not None:
+                self.goal_closure.add_clause(new_statement, i)
+            if closure.add_clause(new_statement, i):
+                for j, rules in self.congruence(True).contradictions():
+                    if self.derive(frozenset(), j, None, ('congruence', rules)):
+                        return True
+
+        # Units, which may rewrite everything else, and the contradiction
+        # are built at once
+        waiting = []
+        for a, b, literals, unifier, note in self.metrics.timed('reductions', self.inferences(i, new_statement)):
+            self.metrics.count(note[0])
+            if self.lazy:
+                kept = [x for x in literals if not antireflexive(x, unifier)]
+                if len(kept) > 1:
+                    waiting.append((kept, Inference(literals, unifier, a, b, note)))
+                    continue
+            # Return should happen from here
+            if self.derive(self.normal(model.sub_all(literals, unifier)), a, b, note):
+                debug_print('I AM DONE!')
+                return True
+        self.defer(waiting)
+        return False
+
+    # The sizes metrics report
+    def sizes(self):
+        return {
+            'passive': len(self.passive_set),
+            'heap': sum(len(queue) for queue in self.passive_set.queues.values()),
+            'canon': len(self.canon),
+            'active': len(self.active),
+            'store': len(self.store),
+            'support': len(self.support),
+        }
+
+    def saturate(self, max_given = None):
+        '''
+        Run the given-clause loop: repeatedly select a statement from the
+        passive set into the canon, and push everything it reduces to
+        with the canon. Returns the proof map of the contradiction once
+        it is found, or None when nothing under max_cost is left, or
+        after max_given selections.
+        '''
+        with metrics.collecting(self.metrics), ac.limiting(self.max_unifiers):
+            try:
+                return self.loop(max_given)
+            finally:
+                self.metrics.report(self.sizes)
 
-    # Return the proof map
-    return proof_map
+    def loop(self, max_given):
+        given = 0
+        while True:
+            if max_given is not None and given >= max_given:
+                return None
+
+            i = self.passive_set.pop()
+
+            if i is None:
+                return None
+
+            if type(i) is Inference:
+                i = self.build(i)
+                if i is None:
+                    continue
+
+            if i in self.canon:
+                continue
+
+            new_statement = ac.normalize_clause(self.store.clause(i))
+
+            # The canon may have grown since this was pushed
+            tainted = i in self.support
+            if self.subsumer(new_statement, tainted) is not None:
+                self.metrics.count('forward subsumption')
+                continue
+
+            if self.entailed(new_statement, tainted):
+                self.metrics.count('entailed')
+                continue
+
+            # ... and so may the rules
+            if next(self.simplifications(new_statement, tainted), None) is not None:
+                if self.derive(new_statement, None, None, None, i):
+                    return self.proof(self.store.find(frozenset()))
+                continue
+
+            given += 1
+            self.metrics.select(self.sizes)
+            if len(new_statement) == 0 or self.select(i, new_statement):
+                return self.proof(self.store.find(frozenset()))
+            if self.checkpoint is not None:
+                self.checkpoint.select(self, None if max_given is None else max_given - given)
+
+    def refute(self, clauses, max_given = None):
+        '''
+        Saturate with clauses as the set of support, until they lead to
+        the contradiction. Returns the proof map of the contradiction, or
+        None. Either way, everything that came from the clauses is
+        forgotten afterwards.
+        '''
+        if self.demodulator is not None:
+            self.goal_demodulator = rewrite.Demodulator(self.ordering)
+            for rule in self.demodulator.clauses:
+                self.goal_demodulator.add(rule)
+        if self.closure is not None:
+            self.goal_closure = self.closure.copy()
+
+        for x in set(self.normal(x) for x in clauses):
+            # Nothing to refute in what the search has already. The store
+            # also keeps what never entered it: statements over the
+            # budget, intermediate steps and simplified ones.
+            i = self.store.find(x)
+            if i is not None and (i in self.canon or i in self.passive_set):
+                continue
+            if i is not None:
+                self.requeued[i] = (self.derivations.get(i), self.cost_map[i], self.distance_map[i])
+            self.support.add(self.assume(x, 0))
+
+        try:
+            return self.saturate(max_given)
+        finally:
+            self.forget()
+
+    def prove(self, statement, max_given = None):
+        # Assume statement is not true, and find a contradiction.
+        with model.scope(self.symbols):
+            if self.library is not None:
+                return self.library.prove(self.axioms, statement, lambda negation: self.refute(negation, max_given))
+            return self.refute(model.cnf(model.Not(statement)), max_given)
+
+    # Drop the set of support and everything that came from it, and put
+    # back what the goal brought back as it was
+    def forget(self):
+        for i in self.support:
+            self.passive_set.discard(i)
+            if i in self.active:
+                self.retire(i)
+            self.canon.discard(i)
+            self.position.pop(i, None)
+            if i in self.requeued:
+                logged, self.cost_map[i], self.distance_map[i] = self.requeued[i]
+                if logged is None:
+                    self.derivations.assume(i)
+                else:
+                    self.derivations.add(i, *logged)
+                continue
+            for table in (self.cost_map, self.distance_map):
+                table.pop(i, None)
+            self.derivations.remove(i)
+            self.store.remove(i)
+        self.support.clear()
+        self.requeued.clear()
+        self.goal_statements.clear()
+        self.goal_demodulator = None
+        self.goal_closure = None
+
+    def derivation(self, i, statement):
+        '''
+        How statement i was derived, as (a, b, note) with its parents by
+        id, or None if it was assumed. Only the parents and the rule are
+        logged, so the note is found again: by rewriting a with the rules
+        used, or by finding the inference of a and b that gives i.
+        statement gives the tree of a statement by id.
+        '''
+        logged = self.derivations.get(i)
+        if logged is None:
+            return None
+        a, b, kind, used = logged
+        if kind == 'congruence':
+            return a, b, (kind, list(used))
+        if kind == 'demodulation':
+            demodulator = rewrite.Demodulator(self.ordering)
+            for rule in used:
+                demodulator.add(statement(rule))
+            return a, b, (kind, demodulator.normalize(statement(a))[1])
+
+        if kind == 'equality resolution':
+            found = superposition.equality_resolutions(statement(a), self.ordering, self.selection)
+        elif kind == 'equality factoring':
+            found = superposition.equality_factorings(statement(a), self.ordering, self.selection)
+        elif kind == 'factoring':
+            found = superposition.factorings(statement(a), self.factoring_ordering(), self.selection)
+        else:
+            found = self.infer(statement(a), statement(b), None)
+        for literals, unifier, note in found:
+            if note[0] == kind and self.store.find(self.normal(model.sub_all(literals, unifier))) == i:
+                return a, b, note
+        raise ValueError('no %s of [%d] and [%d] gives [%d]' % (kind, a, b, i))
+
+    def proof(self, i):
+        '''
+        The part of the proof map that statement i depends on, as trees.
+        '''
+        clauses = {}
+        def clause(j):
+            if j not in clauses:
+                clauses[j] = self.store.clause(j)
+            return clauses[j]
+
+        def statement(j):
+            return ac.normalize_clause(clause(j))
+
+        result = {}
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            if j is None or clause(j) in result:
+                continue
+            derivation = self.derivation(j, statement)
+            if derivation is None:
+                result[clause(j)] = None
+                continue
+
+            # Notes are given as they were when encoded whole, with the
+            # variables of their terms numbered apart from the clauses
+            a, b, note = derivation
+            used = self.derivations.get(j)[3]
+            identify = {statement(rule): rule for rule in used}
+            result[clause(j)] = (
+                None if a is None else clause(a),
+                None if b is None else clause(b),
+                flatterm.decode_note(flatterm.encode_note(note, identify.__getitem__), clause)
+            )
+            stack.extend((a, b))
+            stack.extend(used)
+        return result
+
+def find_contradiction(cnf, h, max_cost = 1000, goal = frozenset(),
+        ratio = passive.DEFAULT_RATIO, max_given = None,
+        calculus = None, ordering = None, demodulate = True,
+        closure = True, lazy = True, workers = None, scorer = None, metrics = None,
+        set_of_support = False, selection = None, checkpoint = None,
+        max_unifiers = None):
+    '''
+    Saturate cnf by the given-clause loop: repeatedly select a statement
+    from the passive set into the canon, and push everything it reduces
+    to with the canon. goal is the part of cnf that comes from the negated
+    goal, used to order the 'goal' queue. Stops when nothing under max_cost
+    is left, or after max_given selections.
+
+    h(x, a, b) is the cost of a statement x derived from a and b, on top
+    of theirs. Unless it is given, the cost is the score scorer gives the
+    features of x, as in scoring, by default ten times the weight of its
+    flatterm; and then, if lazy is set, reductions are only built once
+    selected, and scored a batch at a time.
+
+    calculus is 'superposition', restricted by ordering (a KBO with the
+    default precedence unless given), 'unrestricted' paramodulation and
+    binary reduction, or 'hyperresolution' with unrestricted
+    paramodulation. A selection function, like selection.negative,
+    restricts the inferences of a clause to the literal it picks, if
+    any. If set_of_support is set, two statements that both come from
+    the axioms alone are never reduced with each other: only those that
+    descend from goal start inferences. That is complete for the
+    unrestricted calculus with satisfiable axioms, which is then the
+    default, but not for the others, even without equality: superposition
+    cannot prove Q from P(a) | P(b) and P(x) => Q that way, so they warn.
+
+    If demodulate is set, unit equalities in the canon, oriented by the
+    same ordering, rewrite every new statement.
+    If closure is set, ground unit equalities in the canon are closed
+    under congruence, which drops the ground disequalities they refute
+    from every new statement, and refutes a ground unit disequality as
+    soon as it does. With workers > 1, reductions are spread over that many processes.
+
+    If metrics, a metrics.Metrics, is given, it counts what the search
+    does and times its parts, and reports to its hooks as it goes.
+
+    If checkpoint, a checkpoint.Checkpoint, is given, the whole state of
+    the search is written to its file every so many selections, and
+    checkpoint.resume carries on from there.
+
+    If max_unifiers is given, only that many unifiers modulo AC are
+    tried for each pair of terms, and the rest are given up. Sums with
+    many leaves have many unifiers, so this can make each selection much
+    faster, but the search may then miss a proof it would have found.
+    By default every unifier is tried.
+    '''
+    session = Session(cnf, h, max_cost = max_cost, goal = goal, ratio = ratio,
+        calculus = calculus, ordering = ordering, demodulate = demodulate, closure = closure,
+        lazy = lazy, workers = workers, scorer = scorer, metrics = metrics,
+        set_of_support = set_of_support, selection = selection, checkpoint = checkpoint,
+        max_unifiers = max_unifiers)
+    try:
+        return session.saturate(max_given)
+    finally:
+        session.close()
 
 def n_terms(term):
     r = 0
 
-    if term in model.variables:
+    if model.is_variable(term):
         r += 3
-    elif term in model.constants:
+    elif type(term) is int:
         r += 1
     else:
         r += sum(n_terms(x) for x in term)
@@ -157,9 +932,13 @@ def n_terms(term):
 
     return r
 
-def prove(axioms, statement, h = lambda x, a, b: n_terms(x) * 10):
-    # Assume statement is not true, and find a contradiction.
-    return find_contradiction(axioms | model.cnf(model.Not(statement)), h)
+def prove(axioms, statement, h = None, library = None, **options):
+    # Assume statement is not true, and find a contradiction, unless
+    # library, a lemmas.Library, has one already.
+    refute = lambda negation: find_contradiction(axioms | negation, h, goal = negation, **options)
+    if library is not None:
+        return library.prove(axioms, statement, refute)
+    return refute(model.cnf(model.Not(statement)))
 
 def render_proof(proof_map):
     goal = frozenset()
@@ -173,8 +952,15 @@ def render_proof(proof_map):
         if x in inv_index:
             return
         if proof_map[x] is not None:
-            dfs(proof_map[x][0])
-            dfs(proof_map[x][1])
+            for parent in proof_map[x][:2]:
+                if parent is not None:
+                    dfs(parent)
+            if proof_map[x][2][0] == 'demodulation':
+                for rule, _, _, _ in proof_map[x][2][1]:
+                    dfs(rule)
+            elif proof_map[x][2][0] == 'congruence':
+                for rule in proof_map[x][2][1]:
+                    dfs(rule)
         toposorted.append(x)
         inv_index[x] = len(toposorted)
 
@@ -191,12 +977,41 @@ def render_proof(proof_map):
                 model.render_tree(model.substitute(source, mgu)),
                 model.render_tree(model.substitute(target, mgu))
             ))
-        elif proof_map[x][2][0] == 'reductoin':
-            lines.append('From [%d] and [%d] we can apply the binary reduction of $s, giving us:' % (
+        elif proof_map[x][2][0] == 'reduction':
+            lines.append('From [%d] and [%d] we can apply the binary reduction of %s, giving us:' % (
                 inv_index[proof_map[x][0]],
                 inv_index[proof_map[x][1]],
                 model.render_tree(proof_map[x][2][1])
             ))
+        elif proof_map[x][2][0] == 'equality resolution':
+            lines.append('From [%d] we can unify both sides of %s, giving us:' % (
+                inv_index[proof_map[x][0]],
+                model.render_tree(proof_map[x][2][1])
+            ))
+        elif proof_map[x][2][0] == 'equality factoring':
+            lines.append('From [%d] we can factor %s with an equality of the same term, giving us:' % (
+                inv_index[proof_map[x][0]],
+                model.render_tree(proof_map[x][2][1])
+            ))
+        elif proof_map[x][2][0] == 'factoring':
+            lines.append('From [%d] we can factor %s with a literal it unifies with, giving us:' % (
+                inv_index[proof_map[x][0]],
+                model.render_tree(proof_map[x][2][1])
+            ))
+        elif proof_map[x][2][0] == 'demodulation':
+            lines.append('From [%d] we can rewrite %s, giving us:' % (
+                inv_index[proof_map[x][0]],
+                ', then '.join('%s to %s by [%d]' % (
+                    model.render_tree(model.substitute(source, sub)),
+                    model.render_tree(model.substitute(target, sub)),
+                    inv_index[rule]
+                ) for rule, source, target, sub in proof_map[x][2][1])
+            ))
+        elif proof_map[x][2][0] == 'congruence':
+            lines.append('From [%d] we can drop what %s refute by congruence, giving us:' % (
+                inv_index[proof_map[x][0]],
+                ', '.join('[%d]' % inv_index[rule] for rule in proof_map[x][2][1])
+            ))
         lines.append('  [%d] %s' % (i + 1, model.render_cnf({x})))
 
     return '\n'.join(lines)
@@ -216,6 +1031,8 @@ if __name__ == '__main__':
     render_prefs[times] = 'infix'
     render_prefs[eq] = 'infix'
 
+    # Built into unification and rewriting; the axioms below then drop out
+    model.ac_operators.update((plus, times))
 
     axioms = set.union(
         # Addition is commutative and associative
@@ -296,10 +1113,16 @@ if __name__ == '__main__':
       Universal(x, Relation(eq, Args(Functor(times, Args(x, zero)), zero)))
     ]
 
+    # The consequences of the axioms carry over from one line to the next,
+    # and the proofs to the next run, given a library to keep them in
+    import lemmas
+    library = lemmas.Library(sys.argv[1]) if len(sys.argv) > 1 else None
+    session = Session(axioms, library = library)
+
     for line in proof_lines:
         print('')
         print('We now demonstrate that %s' % (model.render_tree(line),))
-        proof = prove(axioms, line)
+        proof = session.prove(line)
         print('')
         print('Suppose for the sake of contradiction that %s' % (model.render_tree(Not(line)),))
         print('Then the following proof holds.')
@@ -307,4 +1130,8 @@ if __name__ == '__main__':
         print('Thus we have reached a contradiction.')
         print('')
 
-        axioms.update(set(model.canon(x) for x in model.cnf(line)))
+        session.add(model.cnf(line))
+
+    session.close()
+    if library is not None:
+        library.close()
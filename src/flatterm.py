@@ -0,0 +1,288 @@
+import model
+import variants
+import array
+import sys
+
+'''
+FLATTERMS: a list of terms as one flat preorder array of int32s. The
+array starts with the number of terms and the offset of each, then every
+node is a tag, its symbol or variable number and, for functors and
+relations, its arity. Variables are numbered by first occurrence, so an
+encoding does not depend on the symbol tables, and decodes to the
+variables of a canonical clause.
+
+A clause is encoded with its literals in order of shape, as in
+variants, so variants mostly get the same encoding. Encodings are kept
+as little-endian bytes, so that checkpoints and libraries read the same
+on any machine, and on a little-endian one are read through a memoryview
+without copying.
+'''
+
+VAR, CONST, FUNCTOR, RELATION, NOT = range(5)
+
+# The array type of a four-byte int, and whether its bytes are to be
+# swapped to or from an encoding
+INT32 = next(code for code in 'il' if array.array(code).itemsize == 4)
+SWAP = sys.byteorder != 'little'
+
+def encode_term(term, numbering, out):
+    if type(term) is int:
+        if term < 0:
+            out.extend((VAR, numbering.setdefault(term, len(numbering))))
+        else:
+            out.extend((CONST, term))
+    elif type(term) is model.Not:
+        out.append(NOT)
+        encode_term(term.body, numbering, out)
+    else:
+        out.extend((FUNCTOR if type(term) is model.Functor else RELATION, term[0], len(term.arguments)))
+        for argument in term.arguments:
+            encode_term(argument, numbering, out)
+
+def decode_term(data, i):
+    tag = data[i]
+    if tag == VAR:
+        return -data[i + 1] - 1, i + 2
+    elif tag == CONST:
+        return data[i + 1], i + 2
+    elif tag == NOT:
+        body, i = decode_term(data, i + 1)
+        return model.Not(body), i
+    else:
+        symbol, n = data[i + 1], data[i + 2]
+        i += 3
+        arguments = []
+        for _ in range(n):
+            argument, i = decode_term(data, i)
+            arguments.append(argument)
+        return (model.Functor if tag == FUNCTOR else model.Relation)(symbol, model.Args(*arguments)), i
+
+def view(data):
+    if SWAP:
+        return load(data)
+    return memoryview(data).cast(INT32)
+
+def load(data):
+    out = array.array(INT32)
+    out.frombytes(data)
+    if SWAP:
+        out.byteswap()
+    return out
+
+def dump(out):
+    if SWAP:
+        out.byteswap()
+    return out.tobytes()
+
+def encode_terms(terms):
+    out = array.array(INT32, [len(terms)] * (len(terms) + 1))
+    numbering = {}
+    for i, term in enumerate(terms):
+        out[i + 1] = len(out)
+        encode_term(term, numbering, out)
+    return dump(out)
+
+def decode_terms(data):
+    data = view(data)
+    return [decode_term(data, data[i + 1])[0] for i in range(data[0])]
+
+def encode_clause(clause, order = variants.order):
+    return encode_terms(order(clause))
+
+def decode_clause(data):
+    return frozenset(decode_terms(data))
+
+# The same weight as deduction.n_terms gives the decoded clause
+def weight(data):
+    data = view(data)
+    i = data[0] + 1
+    result = 0
+    while i < len(data):
+        tag = data[i]
+        if tag == VAR:
+            result += 3
+            i += 2
+        elif tag == CONST:
+            result += 1
+            i += 2
+        elif tag == NOT:
+            i += 1
+        else:
+            result += 1
+            i += 3
+    return result
+
+# The same encoding with its symbols renamed by symbols, a dict, which
+# leaves out those that are kept
+def rename(data, symbols):
+    out = load(data)
+    i = out[0] + 1
+    while i < len(out):
+        tag = out[i]
+        if tag != VAR and tag != NOT:
+            out[i + 1] = symbols.get(out[i + 1], out[i + 1])
+        i += 1 if tag == NOT else 3 if tag == FUNCTOR or tag == RELATION else 2
+    return dump(out)
+
+'''
+NOTES: how a clause was derived, with its terms flattened. A demodulation
+refers to its rules by clause id, and a congruence, which is already
+given the ids, to the equalities it used.
+'''
+# Kinds are only ever added at the end, since logs and libraries keep
+# their positions
+NOTES = ('reduction', 'paramodulation', 'equality resolution', 'demodulation', 'congruence', 'equality factoring',
+    'factoring')
+
+def encode_note(note, identify = None):
+    kind, payload = note
+    if kind == 'demodulation':
+        return NOTES.index(kind), tuple(
+            (identify(rule), encode_terms([source, target] + [x for pair in sub.items() for x in pair]))
+            for rule, source, target, sub in payload
+        )
+    elif kind == 'congruence':
+        return NOTES.index(kind), tuple(payload)
+    elif kind == 'paramodulation':
+        source, target, mgu = payload
+        terms = [source, target] + [x for pair in mgu.items() for x in pair]
+    else:
+        terms = [payload]
+    return NOTES.index(kind), encode_terms(terms)
+
+def decode_note(data, clause = None):
+    kind = NOTES[data[0]]
+    if kind == 'demodulation':
+        steps = []
+        for rule, terms in data[1]:
+            terms = decode_terms(terms)
+            steps.append((clause(rule), terms[0], terms[1], dict(zip(terms[2::2], terms[3::2]))))
+        return kind, steps
+    elif kind == 'congruence':
+        return kind, [clause(rule) for rule in data[1]]
+
+    terms = decode_terms(data[1])
+    if kind == 'paramodulation':
+        mgu = dict(zip(terms[2::2], terms[3::2]))
+        return kind, (terms[0], terms[1], mgu)
+    return kind, terms[0]
+
+'''
+DERIVATION LOG: how each statement was derived, by id, in arrays indexed
+by id, grown by doubling: its parents, NONE where there is none, and its
+rule, as an index into NOTES, or ASSUMED. Demodulations and congruences
+also keep the ids of the rules they used, in order. Everything else a
+note holds -- unifiers, the terms rewritten -- is left for the search to
+find again, for the few statements a proof needs.
+'''
+NONE = -1
+ASSUMED = -1
+UNKNOWN = -2
+
+class DerivationLog:
+    def __init__(self, size = 1024):
+        self.parents = array.array('q', [NONE]) * (2 * size)
+        self.rules = array.array('b', [UNKNOWN]) * size
+        self.used = {}
+
+    def __contains__(self, i):
+        return i < len(self.rules) and self.rules[i] != UNKNOWN
+
+    def grow(self, i):
+        while i >= len(self.rules):
+            self.parents.extend(array.array('q', [NONE]) * len(self.parents))
+            self.rules.extend(array.array('b', [UNKNOWN]) * len(self.rules))
+
+    def assume(self, i):
+        self.add(i, None, None, None)
+
+    # Log statement i as derived from a and b by the rule of note kind,
+    # with the ids of the rules used, if any
+    def add(self, i, a, b, kind, used = ()):
+        self.grow(i)
+        self.parents[2 * i] = NONE if a is None else a
+        self.parents[2 * i + 1] = NONE if b is None else b
+        self.rules[i] = ASSUMED if kind is None else NOTES.index(kind)
+        if used:
+            self.used[i] = tuple(used)
+        else:
+            self.used.pop(i, None)
+
+    def remove(self, i):
+        if i in self:
+            self.parents[2 * i] = self.parents[2 * i + 1] = NONE
+            self.rules[i] = UNKNOWN
+            self.used.pop(i, None)
+
+    def get(self, i):
+        '''
+        (a, b, kind, ids of the rules used) for statement i, with None
+        for a missing parent, or None if it was assumed.
+        '''
+        if self.rules[i] == ASSUMED:
+            return None
+        a, b = self.parents[2 * i], self.parents[2 * i + 1]
+        return (
+            None if a == NONE else a,
+            None if b == NONE else b,
+            NOTES[self.rules[i]],
+            self.used.get(i, ())
+        )
+
+'''
+CLAUSE STORE: every clause a search has seen, by id, kept only as its
+encoding. Variants get the same id: clauses are looked up by variant
+hash, and told apart by their encodings or, failing that, exactly.
+'''
+class ClauseStore:
+    def __init__(self, canonicalizer = None):
+        self.variants = variants.Canonicalizer() if canonicalizer is None else canonicalizer
+        self.encodings = {}
+        self.keys = {}
+        self.buckets = {}
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.encodings)
+
+    def __contains__(self, i):
+        return i in self.encodings
+
+    def locate(self, clause):
+        '''
+        The encoding and variant hash of a clause, and the id of its
+        variant in the store, or None.
+        '''
+        canonical, key = self.variants.canon(clause)
+        data = encode_clause(canonical, self.variants.order)
+        for i in self.buckets.get(key, ()):
+            if self.encodings[i] == data or self.variants.is_variant(canonical, self.clause(i)):
+                return (data, key), i
+        return (data, key), None
+
+    def find(self, clause):
+        return self.locate(clause)[1]
+
+    # Add a clause unless a variant is stored, with what locate gave for it
+    def add(self, clause, located = None):
+        (data, key), i = self.locate(clause) if located is None else located
+        if i is None:
+            i = self.next_id
+            self.next_id += 1
+            self.encodings[i] = data
+            self.keys[i] = key
+            self.buckets.setdefault(key, []).append(i)
+        return i
+
+    def remove(self, i):
+        del self.encodings[i]
+        key = self.keys.pop(i)
+        self.buckets[key].remove(i)
+        if not self.buckets[key]:
+            del self.buckets[key]
+
+    def clause(self, i):
+        return decode_clause(self.encodings[i])
+
+    def weight(self, i):
+        return weight(self.encodings[i])
@@ -0,0 +1,203 @@
+import model
+import ac
+
+'''
+DISCRIMINATION TREES: terms are stored by their preorder string of symbols,
+with every variable collapsed into one wildcard, and every AC sum into its
+functor alone, since its leaves can pair up in any order. A query only
+walks the branches that could possibly unify (or match) with it, so the
+candidates it returns still have to be checked with mgu, but most of the
+misses never get that far.
+'''
+
+# Marks the entries stored at the end of a path
+LEAF = '.'
+
+def key_of(term):
+    if type(term) is int:
+        return None if term < 0 else term
+    elif type(term) is model.Not:
+        return 'not'
+    elif ac.operator(term) is not None:
+        return (None, term[0], 0)
+    else:
+        return (type(term) is model.Relation, term[0], len(term.arguments))
+
+def arity(key):
+    if key is None or type(key) is int:
+        return 0
+    elif key == 'not':
+        return 1
+    else:
+        return key[2]
+
+def preorder(term):
+    keys = []
+    stack = [term]
+    while stack:
+        term = stack.pop()
+        key = key_of(term)
+        keys.append(key)
+        if type(term) is model.Not:
+            stack.append(term.body)
+        elif arity(key) > 0:
+            stack.extend(reversed(term.arguments))
+    return keys
+
+# For each position in a preorder string, the position where its subterm ends
+def subterm_ends(keys):
+    ends = [0] * len(keys)
+    stack = []
+    for i in reversed(range(len(keys))):
+        end = i + 1
+        for _ in range(arity(keys[i])):
+            end = stack.pop()
+        ends[i] = end
+        stack.append(end)
+    return ends
+
+# All the nodes reached by skipping n complete terms from this node
+def skip(node, n):
+    if n == 0:
+        yield node
+        return
+    for key, child in node.items():
+        if key != LEAF:
+            yield from skip(child, n - 1 + arity(key))
+
+class DiscriminationTree:
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def insert(self, term, value):
+        node = self.root
+        for key in preorder(term):
+            node = node.setdefault(key, {})
+        entries = node.setdefault(LEAF, {})
+        entries[term, value] = entries.get((term, value), 0) + 1
+        self.size += 1
+
+    def remove(self, term, value):
+        path = [self.root]
+        keys = preorder(term)
+        for key in keys:
+            path.append(path[-1][key])
+
+        entries = path[-1][LEAF]
+        entries[term, value] -= 1
+        if entries[term, value] == 0:
+            del entries[term, value]
+        if len(entries) == 0:
+            del path[-1][LEAF]
+        self.size -= 1
+
+        # Prune the branches that are now empty
+        for key, node in zip(reversed(keys), reversed(path[:-1])):
+            if len(node[key]) > 0:
+                break
+            del node[key]
+
+    def _retrieve(self, node, keys, ends, i, mode):
+        if i == len(keys):
+            if LEAF in node:
+                yield from node[LEAF]
+            return
+
+        key = keys[i]
+
+        if key is None and mode != 'generalizations':
+            # The query variable can stand for any stored term
+            for after in skip(node, 1):
+                yield from self._retrieve(after, keys, ends, i + 1, mode)
+            return
+
+        if None in node and mode != 'instances':
+            # A stored variable can stand for the whole query subterm
+            yield from self._retrieve(node[None], keys, ends, ends[i], mode)
+
+        if key is not None and key in node:
+            yield from self._retrieve(node[key], keys, ends, i + 1, mode)
+
+    def retrieve(self, term, mode = 'unifiable'):
+        '''
+        Yield (term, value) for every stored term that might unify with
+        the query ('unifiable'), be more general than it ('generalizations'),
+        or be an instance of it ('instances').
+        '''
+        keys = preorder(term)
+        yield from self._retrieve(self.root, keys, subterm_ends(keys), 0, mode)
+
+def negate(literal):
+    return literal.body if type(literal) is model.Not else model.Not(literal)
+
+def is_equality(literal):
+    return type(literal) is model.Relation and literal.relation == 0
+
+# The positions paramodulation is allowed to rewrite: terms in argument
+# position, but never a negation, a relation, or the symbol of a functor.
+# Inside a sum, those are the leaves.
+def paramodulation_sites(term):
+    if type(term) is model.Not:
+        yield from paramodulation_sites(term.body)
+        return
+
+    if type(term) is not model.Relation:
+        yield term
+
+    if type(term) is not int:
+        op = ac.operator(term)
+        for argument in (term.arguments if op is None else ac.leaves(term, op)):
+            yield from paramodulation_sites(argument)
+
+'''
+CLAUSE INDEX: the three trees needed to find inference partners for
+a clause among the canon.
+'''
+class ClauseIndex:
+    def __init__(self):
+        # Every literal, for binary reduction
+        self.literals = DiscriminationTree()
+        # Every position that can be paramodulated into
+        self.sites = DiscriminationTree()
+        # Both sides of every positive equality
+        self.sides = DiscriminationTree()
+
+    def _entries(self, clause):
+        for literal in clause:
+            yield self.literals, literal, (clause, literal)
+            for site in paramodulation_sites(literal):
+                yield self.sites, site, (clause, literal)
+            if is_equality(literal):
+                for side in literal.arguments:
+                    yield self.sides, side, (clause, literal)
+
+    def add(self, clause):
+        for tree, term, value in self._entries(clause):
+            tree.insert(term, value)
+
+    def remove(self, clause):
+        for tree, term, value in self._entries(clause):
+            tree.remove(term, value)
+
+    def partners(self, clause):
+        '''
+        Map every indexed clause that could take part in a reduction with
+        this one to the set of (its literal, our literal) pairs worth trying.
+        '''
+        result = {}
+        def found(candidates, literal):
+            for _, (partner, partner_literal) in candidates:
+                result.setdefault(partner, set()).add((partner_literal, literal))
+
+        for literal in clause:
+            found(self.literals.retrieve(negate(literal)), literal)
+
+            for site in paramodulation_sites(literal):
+                found(self.sides.retrieve(site), literal)
+
+            if is_equality(literal):
+                for side in literal.arguments:
+                    found(self.sites.retrieve(side), literal)
+
+        return result
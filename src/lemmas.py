@@ -0,0 +1,445 @@
+import model
+import ac
+import flatterm
+import variants
+import index
+import hashlib
+import pickle
+import sqlite3
+
+'''
+LEMMAS: a library of the proofs found, kept in an SQLite file, so that a
+goal proved once against a set of axioms is not searched for again.
+
+Proofs are found again by a fingerprint of the problem: the axioms, as
+clauses in canonical form and encoded as flatterms, the goal, with its
+variables numbered in order of first occurrence, and the names of the
+symbols in either. The same goal asked again, or one that differs only
+in the names of its variables, has the same fingerprint.
+
+A proof is stored as its steps, parents first, each clause and note
+encoded as in flatterm, and steps refer to each other by position. The
+Skolem symbols of the negated goal are new every time it is clausified,
+so they are stored too, in the order they were made, and renamed to
+those of the goal asked. A proof taken from the library is only returned
+once check has found that every step follows from its parents, which
+takes far less time than searching again.
+
+A connection to the file cannot be shared between processes, so each
+process needs its own Library.
+'''
+
+SCHEMA = 'CREATE TABLE IF NOT EXISTS lemmas (fingerprint TEXT PRIMARY KEY, proof BLOB)'
+
+# The symbols of a tree or of the clauses of a set
+def symbols(term, out):
+    if type(term) is int:
+        if term >= 0:
+            out.add(term)
+    else:
+        for x in term:
+            symbols(x, out)
+    return out
+
+# The goal, with its variables numbered as canon numbers those of a clause
+def bound(statement):
+    return model.substitute(statement, {x: -i - 1 for i, x in enumerate(model.all_variables(statement))})
+
+'''
+ENCODING
+'''
+# The clauses of a proof map, with the parents and rules of each before it
+def steps(proof):
+    ordered = {}
+    stack = [(frozenset(), False)]
+    while stack:
+        x, ready = stack.pop()
+        if x in ordered:
+            continue
+        if ready or proof[x] is None:
+            ordered[x] = len(ordered)
+            continue
+        a, b, (kind, payload) = proof[x]
+        stack.append((x, True))
+        rules = [step[0] for step in payload] if kind == 'demodulation' else payload if kind == 'congruence' else ()
+        stack.extend((y, False) for y in (a, b, *rules) if y is not None and y not in ordered)
+    return list(ordered)
+
+def encode(proof, fresh):
+    '''
+    A proof map as bytes, with the Skolem symbols of its negated goal.
+    '''
+    ordered = steps(proof)
+    position = {x: i for i, x in enumerate(ordered)}
+    encoded = []
+    for x in ordered:
+        if proof[x] is None:
+            encoded.append((flatterm.encode_clause(x), None))
+            continue
+        a, b, (kind, payload) = proof[x]
+        if kind == 'congruence':
+            payload = [position[rule] for rule in payload]
+        encoded.append((flatterm.encode_clause(x), (
+            -1 if a is None else position[a],
+            -1 if b is None else position[b],
+            flatterm.encode_note((kind, payload), position.__getitem__)
+        )))
+    return pickle.dumps((tuple(fresh), encoded), pickle.HIGHEST_PROTOCOL)
+
+def decode(data, fresh):
+    '''
+    The proof map of bytes from encode, with its Skolem symbols renamed
+    to fresh, or None if there are not as many of them.
+    '''
+    stored, encoded = pickle.loads(data)
+    if len(stored) != len(fresh):
+        return None
+    renaming = {x: y for x, y in zip(stored, fresh) if x != y}
+    rename = (lambda data: flatterm.rename(data, renaming)) if renaming else (lambda data: data)
+
+    clauses = []
+    proof = {}
+    for data, derivation in encoded:
+        x = flatterm.decode_clause(rename(data))
+        clauses.append(x)
+        if derivation is None:
+            proof[x] = None
+            continue
+        a, b, (kind, payload) = derivation
+        if kind == flatterm.NOTES.index('demodulation'):
+            payload = tuple((rule, rename(terms)) for rule, terms in payload)
+        elif kind != flatterm.NOTES.index('congruence'):
+            payload = rename(payload)
+        proof[x] = (
+            None if a == -1 else clauses[a],
+            None if b == -1 else clauses[b],
+            flatterm.decode_note((kind, payload), clauses.__getitem__)
+        )
+    return proof
+
+'''
+CHECKING: each step is built again from its parents, a literal at a
+time, without the inferences of the search, so that a proof found by a
+faulty calculus is not taken on its word. A step holds if some instance
+of what its rule gives, modulo AC, is contained in the clause: then the
+clause follows from its parents. A unifier is only taken once both of
+its sides are seen to be the same under it, and a step that cannot be
+rebuilt fails the check, so the worst a check can do is send the search
+out again.
+'''
+def atom(literal):
+    return literal.body if type(literal) is model.Not else literal
+
+def same(s, t, sub):
+    return ac.normalize(model.substitute(s, sub)) == ac.normalize(model.substitute(t, sub))
+
+# The unifiers of s and t, each seen to unify them
+def unifiers(s, t):
+    return (sub for sub in ac.unifiers(s, t) if same(s, t, sub))
+
+# A literal, and the same with the sides of an equality swapped
+def orientations(literal):
+    if index.is_equality(atom(literal)):
+        swapped = model.Relation(0, model.Args(*reversed(atom(literal).arguments)))
+        return [literal, model.Not(swapped) if type(literal) is model.Not else swapped]
+    return [literal]
+
+# Whether some instance of all of literals, substituted by sub, is in
+# clause, whose variables are taken as constants. A term is never
+# unequal to itself, so such a literal can be left out.
+def contained(literals, sub, clause):
+    literals = set(ac.normalize(model.substitute(x, sub)) for x in literals)
+    literals = [x for x in literals if not (type(x) is model.Not and is_reflexive(x.body))]
+    def search(i, matcher):
+        if i == len(literals):
+            return True
+        return any(
+            search(i + 1, extended)
+            for y in clause for z in orientations(y) for extended in ac.match(literals[i], z, matcher)
+        )
+    return search(0, {})
+
+# Every subterm of a term below its relation, with a function that puts
+# another term in its place
+def positions(term):
+    if type(term) is int:
+        yield term, lambda x: x
+        return
+    if type(term) is model.Functor:
+        yield term, lambda x: x
+    for i, argument in enumerate(term.arguments):
+        for subterm, rebuild in positions(argument):
+            yield subterm, (lambda x, i = i, rebuild = rebuild: type(term)(term[0], model.Args(*(
+                rebuild(x) if j == i else y for j, y in enumerate(term.arguments)
+            ))))
+
+def is_reflexive(literal):
+    return index.is_equality(literal) and literal.arguments[0] == literal.arguments[1]
+
+def equalities(clause):
+    return [x for x in clause if type(x) is not model.Not and index.is_equality(x)]
+
+def resolvent(a, b, x):
+    for la in a:
+        for lb in b:
+            if (type(la) is model.Not) != (type(lb) is model.Not):
+                for sub in unifiers(atom(la), atom(lb)):
+                    if contained([y for y in a if y != la] + [y for y in b if y != lb], sub, x):
+                        return True
+    return False
+
+def paramodulant(a, b, x):
+    for into, rest in ((b, a), (a, b)):
+        for equality in equalities(rest):
+            kept = [y for y in rest if y != equality]
+            for s, t in (equality.arguments, reversed(equality.arguments)):
+                for literal in into:
+                    negated = type(literal) is model.Not
+                    for subterm, rebuild in positions(atom(literal)):
+                        forms = [(s, t)]
+                        op = ac.operator(subterm)
+                        if op is not None and ac.operator(s) == op:
+                            forms.append(ac.extend(s, t, op))
+                        for source, target in forms:
+                            rewritten = rebuild(target)
+                            rewritten = model.Not(rewritten) if negated else rewritten
+                            others = kept + [y for y in into if y != literal] + [rewritten]
+                            for sub in unifiers(source, subterm):
+                                if contained(others, sub, x):
+                                    return True
+    return False
+
+def equality_resolvent(a, x):
+    for literal in a:
+        if type(literal) is model.Not and index.is_equality(literal.body):
+            for sub in unifiers(*literal.body.arguments):
+                if contained([y for y in a if y != literal], sub, x):
+                    return True
+    return False
+
+def equality_factor(a, x):
+    for literal in equalities(a):
+        for other in equalities(a):
+            if other is literal:
+                continue
+            for s, t in (literal.arguments, reversed(literal.arguments)):
+                for s2, t2 in (other.arguments, reversed(other.arguments)):
+                    disequality = model.Not(model.Relation(0, model.Args(t, t2)))
+                    for sub in unifiers(s, s2):
+                        if contained([y for y in a if y != literal] + [disequality], sub, x):
+                            return True
+    return False
+
+# Put target in place of every occurrence of source in term, and of
+# source as part of a sum
+def replace(term, source, target):
+    if term == source:
+        return target
+    if type(term) is int:
+        return term
+    op = ac.operator(term)
+    if op is not None and ac.operator(source) == op:
+        parts = ac.leaves(term, op)
+        for x in ac.leaves(source, op):
+            if x not in parts:
+                break
+            parts.remove(x)
+        else:
+            if parts:
+                return ac.sum_of(op, [target] + parts)
+    return type(term)(term[0], model.Args(*(replace(x, source, target) for x in term.arguments)))
+
+def rewritten(literal, source, target):
+    if type(literal) is model.Not:
+        return ac.normalize(model.Not(replace(literal.body, source, target)))
+    return ac.normalize(replace(literal, source, target))
+
+# Literals with one instance of source rewritten to the same instance of
+# target, or None if there is none
+def rewrite_instance(literals, source, target):
+    for k, literal in enumerate(literals):
+        for subterm, rebuild in positions(atom(literal)):
+            for matcher in ac.match(source, subterm, {}):
+                result = rebuild(model.substitute(target, matcher))
+                result = model.Not(result) if type(literal) is model.Not else result
+                return literals[:k] + [ac.normalize(result)] + literals[k + 1:]
+    return None
+
+# Rewrite a by each step in turn, once its source and target are seen
+# to be an instance of the sides of its rule. The matcher of a step is
+# that of the clause before it was renamed, so when its instance is not
+# there another one is looked for; a step may also find nothing left to
+# rewrite, since every occurrence of an instance is rewritten at once.
+def demodulated(a, steps, x):
+    literals = list(a)
+    for rule, source, target, sub in steps:
+        if len(rule) != 1 or not equalities(rule):
+            return False
+        l, r = next(iter(rule)).arguments
+        sides = [(l, r), (r, l)]
+        sides.extend(ac.extend(s, t, ac.operator(s)) for s, t in ((l, r), (r, l)) if ac.operator(s) is not None)
+        step = model.Args(source, target)
+        if not any(next(ac.match(model.Args(s, t), step, {}), None) is not None for s, t in sides):
+            return False
+        instance = [ac.normalize(model.substitute(y, sub)) for y in (source, target)]
+        result = [rewritten(y, *instance) for y in literals]
+        if result == literals:
+            result = rewrite_instance(literals, *ac.normalize(model.substitute(step, model.renaming(step, 2))))
+        if result is not None:
+            literals = result
+    return contained(literals, {}, x)
+
+# Ground terms that are equal by the equalities of rules, by congruence
+# closure over the subterms of both and of the rules
+def congruent(s, t, rules):
+    pairs = []
+    for rule in rules:
+        if len(rule) != 1 or not equalities(rule) or not next(iter(rule)).ground:
+            return False
+        pairs.append(tuple(next(iter(rule)).arguments))
+    terms = set()
+    for term in [s, t] + [x for pair in pairs for x in pair]:
+        terms.update(y for y, _ in positions(term))
+    parent = {x: x for x in terms}
+    def find(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+    for u, v in pairs:
+        parent[find(u)] = find(v)
+    compound = [x for x in terms if type(x) is model.Functor]
+    changed = True
+    while changed and find(s) != find(t):
+        changed = False
+        for u in compound:
+            for v in compound:
+                if (find(u) != find(v) and u[0] == v[0] and len(u.arguments) == len(v.arguments) and
+                        all(find(p) == find(q) for p, q in zip(u.arguments, v.arguments))):
+                    parent[find(u)] = find(v)
+                    changed = True
+    return find(s) == find(t)
+
+# Every literal of a dropped from x is a disequality the rules refute
+def simplified(a, rules, x):
+    kept = []
+    for literal in a:
+        if type(literal) is model.Not and index.is_equality(literal.body) and congruent(*literal.body.arguments, rules):
+            continue
+        kept.append(literal)
+    return contained(kept, {}, x)
+
+def follows(x, a, b, kind, payload):
+    '''
+    Whether x follows from a and b by a rule of kind, with its note's
+    payload.
+    '''
+    if kind == 'reduction':
+        return resolvent(a, b, x)
+    if kind == 'paramodulation':
+        return paramodulant(a, b, x)
+    if kind == 'equality resolution':
+        return equality_resolvent(a, x)
+    if kind == 'equality factoring':
+        return equality_factor(a, x)
+    if kind == 'factoring':
+        # Every instance of a clause follows from it
+        return contained(a, {}, x)
+    if kind == 'demodulation':
+        return demodulated(a, payload, x)
+    if kind == 'congruence':
+        return simplified(a, payload, x)
+    return False
+
+def check(proof, assumptions):
+    '''
+    Whether proof, a proof map, derives the contradiction from
+    assumptions, a set of clauses, step by step.
+    '''
+    canonicalizer = variants.Canonicalizer()
+    def normal(x):
+        return ac.normalize_clause(canonicalizer.canon(ac.normalize_clause(x))[0])
+
+    assumed = flatterm.ClauseStore(canonicalizer)
+    for x in assumptions:
+        assumed.add(normal(x))
+
+    if frozenset() not in proof:
+        return False
+    for x, derivation in proof.items():
+        if derivation is None:
+            if assumed.find(normal(x)) is None:
+                return False
+            continue
+        a, b, (kind, payload) = derivation
+        rules = [step[0] for step in payload] if kind == 'demodulation' else payload if kind == 'congruence' else ()
+        if any(y is not None and y not in proof for y in (a, b, *rules)):
+            return False
+        if a is None or (b is None and kind in ('reduction', 'paramodulation')):
+            return False
+        if kind == 'demodulation':
+            payload = [(ac.normalize_clause(rule), source, target, sub) for rule, source, target, sub in payload]
+        elif kind == 'congruence':
+            payload = [ac.normalize_clause(rule) for rule in payload]
+        a = ac.normalize_clause(a)
+        # b is renamed apart from a
+        b = None if b is None else ac.normalize_clause(model.sub_all(b, model.renaming(b)))
+        if not follows(ac.normalize_clause(x), a, b, kind, payload):
+            return False
+    return True
+
+'''
+LIBRARY
+'''
+class Library:
+    def __init__(self, path = ':memory:'):
+        '''
+        Keep proofs in the SQLite file at path, or in memory only.
+        '''
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(SCHEMA)
+        self.canonicalizer = variants.Canonicalizer()
+
+    def close(self):
+        self.connection.close()
+
+    def fingerprint(self, axioms, statement):
+        '''
+        The fingerprint of proving statement from axioms, a set of clauses.
+        '''
+        statement = bound(statement)
+        encodings = sorted(
+            flatterm.encode_clause(self.canonicalizer.canon(ac.normalize_clause(x))[0], self.canonicalizer.order)
+            for x in axioms
+        )
+        used = symbols(statement, symbols(axioms, set()))
+        names = [(x, model.symbols.constants.get(x)) for x in sorted(used)]
+        return hashlib.sha256(repr((encodings, repr(statement), names)).encode()).hexdigest()
+
+    def get(self, key, fresh):
+        row = self.connection.execute('SELECT proof FROM lemmas WHERE fingerprint = ?', (key,)).fetchone()
+        return None if row is None else decode(row[0], fresh)
+
+    def put(self, key, proof, fresh):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO lemmas VALUES (?, ?)', (key, encode(proof, fresh)))
+
+    def prove(self, axioms, statement, refute):
+        '''
+        The proof map of statement from axioms, a set of clauses: the one
+        in the library, if it checks, or else the one refute finds for
+        the clauses of the negated statement, which is then kept. None
+        if there is none.
+        '''
+        key = self.fingerprint(axioms, statement)
+        first = len(model.symbols.constants)
+        negation = model.cnf(model.Not(statement))
+        fresh = range(first, len(model.symbols.constants))
+
+        proof = self.get(key, fresh)
+        if proof is not None and check(proof, set(axioms) | negation):
+            return proof
+        proof = refute(negation)
+        if proof is not None:
+            self.put(key, proof, fresh)
+        return proof
@@ -0,0 +1,178 @@
+import collections
+import contextlib
+import json
+import time
+
+'''
+METRICS: what a search does and where its time goes, for those who ask.
+
+Counters are named after what they count: each kind of inference, each
+reason a statement is dropped, unifications and the ones that fail.
+Timers add up the seconds spent in a part of the search, including any
+part timed within it, and how many times it was entered. Every so many
+selections, and when the search stops, a snapshot of all of them, with
+the sizes of the passive set, the canon and the store, goes to each of
+the hooks: any callable that takes a dict, like JsonLines or Sample.
+
+Searches are silent unless given a Metrics. While one collects, it is
+metrics.current, so that unification, deep inside the calculus, can
+report to it without being told.
+'''
+
+current = None
+
+NOTHING = contextlib.nullcontext()
+
+class Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exception):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, every = 100, hooks = ()):
+        '''
+        Report to each of the hooks every so many selections.
+        '''
+        self.every = every
+        self.hooks = list(hooks)
+        self.counters = collections.Counter()
+        self.seconds = collections.Counter()
+        self.calls = collections.Counter()
+        self.given = 0
+        self.start = time.perf_counter()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def count(self, name, n = 1):
+        self.counters[name] += n
+
+    def add_time(self, name, seconds):
+        self.seconds[name] += seconds
+        self.calls[name] += 1
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def timed(self, name, iterable):
+        '''
+        Iterate, timing only what it takes to produce each item.
+        '''
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                x = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start)
+                return
+            self.seconds[name] += time.perf_counter() - start
+            yield x
+
+    def unifications(self, found):
+        # found is every unifier of one pair of terms
+        with self.timer('unification'):
+            found = list(found)
+        self.count('unification')
+        if not found:
+            self.count('unification failure')
+        return found
+
+    def snapshot(self, sizes):
+        result = {
+            'given': self.given,
+            'elapsed': time.perf_counter() - self.start,
+        }
+        result.update(sizes)
+        result['counters'] = dict(self.counters)
+        result['seconds'] = dict(self.seconds)
+        result['calls'] = dict(self.calls)
+        return result
+
+    def report(self, sizes):
+        snapshot = self.snapshot(sizes())
+        for hook in self.hooks:
+            hook(snapshot)
+
+    # One more selection; sizes gives the sizes to report, if it is time
+    def select(self, sizes):
+        self.given += 1
+        if self.every and self.given % self.every == 0:
+            self.report(sizes)
+
+class Silent(Metrics):
+    '''
+    Metrics that keep nothing, for a search no one is measuring.
+    '''
+    enabled = False
+
+    def __init__(self):
+        super().__init__(every = 0)
+
+    def count(self, name, n = 1):
+        pass
+
+    def add_time(self, name, seconds):
+        pass
+
+    def timer(self, name):
+        return NOTHING
+
+    def timed(self, name, iterable):
+        return iterable
+
+    def report(self, sizes):
+        pass
+
+    def select(self, sizes):
+        pass
+
+SILENT = Silent()
+
+@contextlib.contextmanager
+def collecting(metrics):
+    '''
+    Make metrics current for the duration.
+    '''
+    global current
+    previous = current
+    current = metrics if metrics.enabled else None
+    try:
+        yield metrics
+    finally:
+        current = previous
+
+'''
+HOOKS
+'''
+class JsonLines:
+    '''
+    Write each snapshot as a line of JSON to a file, given by its path
+    or already open.
+    '''
+    def __init__(self, file):
+        self.file = open(file, 'a') if isinstance(file, str) else file
+
+    def __call__(self, snapshot):
+        self.file.write(json.dumps(snapshot) + '\n')
+        self.file.flush()
+
+class Sample:
+    '''
+    Keep the latest size snapshots, oldest first, in snapshots.
+    '''
+    def __init__(self, size = 100):
+        self.snapshots = collections.deque(maxlen = size)
+
+    def __call__(self, snapshot):
+        self.snapshots.append(snapshot)
@@ -1,66 +1,177 @@
-from collections import namedtuple
+import operator
+import weakref
+import contextlib
 
-# Variables are integers.
+# Variables are negative integers.
 
-# Constants are integers. Variables and constants exist in the same space.
+# Constants are positive integers, and 0 is equality. Variables and
+# constants exist in the same space, and telling them apart needs no table.
 
 DEBUG = False
 def debug_print(*args):
     if DEBUG:
         print(*args)
 
-current_identifier = 0
+def is_variable(x):
+    return type(x) is int and x < 0
 
-constants = {0: '='}
-variables = {}
-var_list = []
+'''
+SYMBOL TABLES: the names of the constants and variables of a problem, and
+how to render them. Only the symbols a problem is stated in are kept, so
+a table does not grow with the search.
+
+The variables of a canonical clause are -1, -2, ... in order of first
+occurrence, named after the variables made with newvar in the same order.
+A clause is renamed apart by offsetting its variables into the next range
+of VARIABLE_RANGE, so renaming never makes a new symbol, and a variable
+of a later range is rendered with a prime for each range.
+
+The functors in ac_operators are associative and commutative, and are
+handled by the ac module rather than by axioms.
+
+The module-level newconst, newvar, constants, variables, render_prefs
+and ac_operators refer to the table in scope, which can be swapped for
+another problem's.
+'''
+VARIABLE_RANGE = 1 << 16
+
+class SymbolTable:
+    def __init__(self):
+        self.constants = {0: '='}
+        self.variables = {}
+        self.render_prefs = {}
+        self.ac_operators = set()
+
+    # Create new constants or new variables.
+    def newconst(self, name = None):
+        identifier = len(self.constants)
+        self.constants[identifier] = name.upper() if name else 'C_{%s}' % (identifier,)
+        return identifier
+
+    def newvar(self, name = None):
+        identifier = -(len(self.variables) + 1)
+        self.variables[identifier] = name.lower() if name else 'v_{%s}' % (-identifier,)
+        return identifier
+
+    def variable_name(self, variable):
+        offset, index = divmod(-variable - 1, VARIABLE_RANGE)
+        name = self.variables.get(-index - 1, 'v_{%s}' % (index + 1,))
+        return name + '\'' * offset
+
+symbols = SymbolTable()
+
+@contextlib.contextmanager
+def scope(table):
+    global symbols
+    previous, symbols = symbols, table
+    try:
+        yield table
+    finally:
+        symbols = previous
 
-# Create new constants or new variables.
 def newconst(name = None):
-    global current_identifier
-    current_identifier += 1
-    constants[current_identifier] = (name.upper() or 'C_{%s}' % (current_identifier,))
-    return current_identifier
+    return symbols.newconst(name)
 
 def newvar(name = None):
-    global current_identifier
-    current_identifier += 1
-    variables[current_identifier] = (name.lower() or 'v_{%s}' % (current_identifier,))
-    var_list.append(current_identifier)
-    return current_identifier
+    return symbols.newvar(name)
 
-# The entire language:
-Functor = namedtuple('Functor', ('functor', 'arguments'))
-Relation = namedtuple('Relation', ('relation', 'arguments'))
+def __getattr__(name):
+    if name in ('constants', 'variables', 'render_prefs', 'ac_operators'):
+        return getattr(symbols, name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
 
-And = namedtuple('And', ('left', 'right'))
-Or = namedtuple('Or', ('left', 'right'))
-Not = namedtuple('Not', ('body',))
+'''
+TERMS: every node is hash-consed, so that structurally equal terms are
+the same object. Equality is identity, the hash is computed once, and
+each node caches its size and the set of variables occurring in it.
+'''
+interned = weakref.WeakValueDictionary()
+
+class Term:
+    __slots__ = ('_items', '_hash', 'size', 'varset', '__weakref__')
+    _fields = ()
+    _tag = 0
+
+    def __new__(cls, *items):
+        key = (cls._tag, items)
+        term = interned.get(key)
+        if term is not None:
+            return term
+
+        term = object.__new__(cls)
+        term._items = items
+        term._hash = hash(key)
+
+        size = 1
+        varset = frozenset()
+        for x in items:
+            if type(x) is int:
+                size += 1
+                if x < 0:
+                    varset = varset | {x}
+            else:
+                size += x.size
+                if x.varset:
+                    varset = varset | x.varset if varset else x.varset
+        term.size = size
+        term.varset = varset
 
-Universal = namedtuple('Universal', ('variable', 'body'))
-Existential = namedtuple('Existential', ('variable', 'body'))
+        interned[key] = term
+        return term
 
-Implies = namedtuple('Implies', ('left', 'right'))
-Iff = namedtuple('Iff', ('left', 'right'))
+    @property
+    def ground(self):
+        return not self.varset
 
-# Fix the equality relation
-def correct_equality(t):
-    def eq(self, other):
-        return type(self) == type(other) and super(t, self).__eq__(other)
-    return eq
-for t in (Functor, Relation, And, Or, Not, Universal, Existential, Implies, Iff):
-    t.__eq__ = correct_equality(t)
+    def __hash__(self):
+        return self._hash
 
-# Arguments tuple
-class Args(tuple):
-    def __new__(cls, *args):
-        return super(Args, cls).__new__(cls, args)
+    def __iter__(self):
+        return iter(self._items)
 
-    def __eq__(self, other):
-        return type(self) == type(other) and super().__eq__(other)
+    def __len__(self):
+        return len(self._items)
 
-    def __hash__(self):
-        return super().__hash__()
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def __reduce__(self):
+        return (type(self), self._items)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % pair for pair in zip(self._fields, self._items)
+        ))
+
+term_types = []
+
+def term_type(name, fields):
+    namespace = {'__slots__': (), '_fields': fields, '_tag': len(term_types) + 1}
+    for i, field in enumerate(fields):
+        namespace[field] = property(operator.itemgetter(i))
+    term_types.append(type(name, (Term,), namespace))
+    return term_types[-1]
+
+# The entire language:
+Functor = term_type('Functor', ('functor', 'arguments'))
+Relation = term_type('Relation', ('relation', 'arguments'))
+
+And = term_type('And', ('left', 'right'))
+Or = term_type('Or', ('left', 'right'))
+Not = term_type('Not', ('body',))
+
+Universal = term_type('Universal', ('variable', 'body'))
+Existential = term_type('Existential', ('variable', 'body'))
+
+Implies = term_type('Implies', ('left', 'right'))
+Iff = term_type('Iff', ('left', 'right'))
+
+# Arguments tuple
+class Args(Term):
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'Args%r' % (self._items,)
 
 '''
 SUBSTITUTION
@@ -68,7 +179,9 @@ SUBSTITUTION
 def substitute(x, sub):
     if type(x) is int:
         return (sub[x] if x in sub else x)
-    debug_print(render_tree(x))
+    # Nothing to rebuild if none of its variables are substituted
+    if x.varset.isdisjoint(sub):
+        return x
     return type(x)(*(substitute(k, sub) for k in x))
 
 def sub_all(x, sub):
@@ -76,7 +189,9 @@ def sub_all(x, sub):
 
 def all_variables_set(term):
     if type(term) is int:
-        return ({term}, [term]) if term in variables else (set(), [])
+        return ({term}, [term]) if term < 0 else (set(), [])
+    elif isinstance(term, Term) and term.ground:
+        return (set(), [])
     else:
         # Enforce a consistent ordering
         if type(term) is set or type(term) is frozenset:
@@ -109,156 +224,296 @@ def canon(disjunction):
     )
 
     # Confine all variables to a finite set
-    variter = iter(var_list)
-    return sub_all(disjunction, {x: next(variter) for x in all_variables(disjunction)})
+    sub = {x: -i - 1 for i, x in enumerate(all_variables(disjunction)) if x != -i - 1}
+    return sub_all(disjunction, sub) if sub else disjunction
 
-'''
-MOST GENERAL UNIFIER: returns a new expression with unification.
-'''
-def disagree(a, b):
-    if type(a) != type(b):
-        return (a, b)
-    elif type(a) is not int:
-        return next(
-            (d for d in (disagree(x, y) for (x, y) in zip(a, b)) if d is not None),
-            None
-        )
-    elif a != b:
-        return (a, b)
-    else:
-        return None
+# Rename the variables into the given range, apart from those of
+# any canonical clause
+def renaming(disjunction, offset = 1):
+    return {x: -offset * VARIABLE_RANGE - i - 1 for i, x in enumerate(all_variables(disjunction))}
 
 def uniquify(disjunction):
-    return sub_all(disjunction,
-            {x: newvar(variables[x] + '\'') for x in all_variables(disjunction)}
-    )
-
-def variable_in(x, y):
-    if type(y) is int:
-        return x == y
-    else:
-        return any(variable_in(x, z) for z in y)
+    return sub_all(disjunction, renaming(disjunction))
 
-def mgu(a, b):
-    sub = {}
+'''
+MOST GENERAL UNIFIER: bindings are kept triangular (a variable may be bound
+to a term containing other bound variables) while a worklist of pairs is
+unified in one pass, and only resolved into an idempotent substitution at
+the end, so that it can be used with substitute and sub_all.
+'''
+# Follow the bindings of a variable until reaching a term or a free variable
+def walk(x, bindings):
+    while type(x) is int and x in bindings:
+        x = bindings[x]
+    return x
+
+# Does variable x occur in term y once the bindings are applied? Only the
+# variables of each term are visited, never its structure.
+def occurs(x, y, bindings):
+    stack = [y]
+    seen = set()
+    while stack:
+        y = stack.pop()
+        for variable in ((y,) if type(y) is int else y.varset):
+            if variable == x:
+                return True
+            if variable in bindings and variable not in seen:
+                seen.add(variable)
+                stack.append(bindings[variable])
+    return False
+
+def resolve(x, bindings):
+    if type(x) is int:
+        if x not in bindings:
+            return x
+        resolved = bindings[x] = resolve(bindings[x], bindings)
+        return resolved
+    if x.varset.isdisjoint(bindings):
+        return x
+    return type(x)(*(resolve(k, bindings) for k in x))
+
+# Extend the triangular bindings to unify a and b; False if impossible
+def unify(a, b, bindings):
+    stack = [(a, b)]
+
+    while stack:
+        a, b = stack.pop()
+        a = walk(a, bindings)
+        b = walk(b, bindings)
+
+        if a is b:
+            continue
+
+        if type(a) is int and a < 0:
+            if occurs(a, b, bindings):
+                return False
+            bindings[a] = b
+        elif type(b) is int and b < 0:
+            if occurs(b, a, bindings):
+                return False
+            bindings[b] = a
+        elif type(a) is int or type(b) is int:
+            if a != b:
+                return False
+        elif type(a) is not type(b) or len(a) != len(b) or (a.ground and b.ground):
+            # Interned ground terms are only equal if identical
+            return False
+        else:
+            stack.extend(reversed(tuple(zip(a, b))))
 
-    while True:
-        diff = disagree(a, b)
+    return True
 
-        if diff is None:
-            return sub
+def mgu(a, b, sub = None):
+    bindings = {} if sub is None else dict(sub)
+    if not unify(a, b, bindings):
+        return None
+    return {x: resolve(x, bindings) for x in list(bindings)}
 
-        if diff[0] in variables and not variable_in(diff[0], diff[1]):
-            sub[diff[0]] = diff[1]
-        elif diff[1] in variables and not variable_in(diff[1], diff[0]):
-            sub[diff[1]] = diff[0]
-        else:
+'''
+MATCHING: extends sub so that substituting into the pattern alone gives the term.
+Variables of the term are treated as constants.
+'''
+def match(pattern, term, sub = None):
+    sub = {} if sub is None else dict(sub)
+    stack = [(pattern, term)]
+
+    while stack:
+        pattern, term = stack.pop()
+
+        if type(pattern) is int:
+            if pattern < 0:
+                if pattern not in sub:
+                    sub[pattern] = term
+                elif sub[pattern] != term:
+                    return None
+            elif pattern != term:
+                return None
+        elif pattern.ground or type(pattern) is not type(term):
+            if pattern is not term:
+                return None
+        elif len(pattern) != len(term):
             return None
+        else:
+            stack.extend(zip(pattern, term))
 
-        a = substitute(a, sub)
-        b = substitute(b, sub)
+    return sub
 
 '''
-CNF: returns a set of sets of terms
+CNF: returns a set of sets of terms. Equivalences are named first, then
+the formula is put in negation normal form, its quantifiers are pushed
+in as far as they go and Skolemized in a single pass, and the result is
+multiplied out into clauses.
+
+Subformulas that would otherwise be copied -- a side of an equivalence
+that is not a literal, and the larger operand of a disjunction whose
+clauses would multiply past DEFINITION_THRESHOLD -- are replaced by a new
+relation over their free variables, and defined by clauses of their own,
+so that the number of clauses grows linearly with the formula.
 '''
-def strip_inference(tree):
-    if type(tree) is Iff:
-        # Expand equivalencies into two implications
-        left = strip_inference(tree.left)
-        right = strip_inference(tree.right)
-        return Or(And(left, right), And(Not(left), Not(right)))
-
-    if type(tree) is Implies:
-        # Expand implications into disjunctive form
-        return Or(Not(strip_inference(tree.left)), strip_inference(tree.right))
-
-    elif type(tree) is int:
-        return tree
+DEFINITION_THRESHOLD = 4
+
+connectives = (And, Or, Not, Implies, Iff, Universal, Existential)
 
+def is_literal(tree):
+    if type(tree) is Not:
+        tree = tree.body
+    return type(tree) not in connectives
+
+def free_variables(tree):
+    if type(tree) is int:
+        return frozenset((tree,)) if tree < 0 else frozenset()
+    elif tree.ground:
+        return frozenset()
+    elif type(tree) is Universal or type(tree) is Existential:
+        return free_variables(tree.body) - {tree.variable}
     else:
-        return type(tree)(*(strip_inference(x) for x in tree))
+        return frozenset().union(*(free_variables(x) for x in tree))
+
+def definition(variables):
+    return Relation(newconst('d_{%s}' % (len(symbols.constants),)), Args(*sorted(variables)))
+
+# Name the sides of every equivalence that are not literals, adding
+# the definitions, each both ways round, to definitions
+def name_equivalences(tree, definitions, names):
+    if type(tree) is int or type(tree) not in connectives:
+        return tree
+
+    elif type(tree) is Universal or type(tree) is Existential:
+        return type(tree)(tree.variable, name_equivalences(tree.body, definitions, names))
+
+    tree = type(tree)(*(name_equivalences(x, definitions, names) for x in tree))
+    if type(tree) is not Iff:
+        return tree
 
-# Move all Nots as far into the tree as possible
-def strip_negation(tree):
+    sides = []
+    for side in tree:
+        if not is_literal(side):
+            if side not in names:
+                free = free_variables(side)
+                names[side] = atom = definition(free)
+                defined = And(Or(Not(atom), side), Or(atom, Not(side)))
+                for variable in sorted(free):
+                    defined = Universal(variable, defined)
+                definitions.append(defined)
+            side = names[side]
+        sides.append(side)
+    return Iff(*sides)
+
+# Move all Nots onto the literals, and expand implications and
+# equivalences, whose sides are literals by now
+def nnf(tree, positive = True):
     if type(tree) is Not:
-        # Not negates itself
-        if type(tree.body) is Not:
-            return strip_negation(tree.body.body)
+        return nnf(tree.body, not positive)
 
+    elif type(tree) is And or type(tree) is Or:
         # And and Or switch
-        if type(tree.body) is And:
-            return Or(strip_negation(Not(tree.body.left)), strip_negation(Not(tree.body.right)))
+        joint = type(tree) if positive else (Or if type(tree) is And else And)
+        return joint(nnf(tree.left, positive), nnf(tree.right, positive))
+
+    elif type(tree) is Implies:
+        return nnf(Or(Not(tree.left), tree.right), positive)
 
-        if type(tree.body) is Or:
-            return And(strip_negation(Not(tree.body.left)), strip_negation(Not(tree.body.right)))
+    elif type(tree) is Iff:
+        left, right = tree
+        if positive:
+            return And(nnf(Or(Not(left), right)), nnf(Or(left, Not(right))))
+        else:
+            return And(nnf(Or(left, right)), nnf(Or(Not(left), Not(right))))
 
+    elif type(tree) is Universal or type(tree) is Existential:
         # Universal and Existential switch
-        if type(tree.body) is Universal:
-            return Existential(tree.body.variable, strip_negation(Not(tree.body.body)))
+        quantifier = type(tree) if positive else (Existential if type(tree) is Universal else Universal)
+        return quantifier(tree.variable, nnf(tree.body, positive))
 
-        if type(tree.body) is Existential:
-            return Universal(tree.body.variable, strip_negation(Not(tree.body.body)))
+    return tree if positive else Not(tree)
 
+# Push every quantifier of an NNF tree as far in as it goes
+def miniscope(tree):
+    if type(tree) is And or type(tree) is Or:
+        return type(tree)(miniscope(tree.left), miniscope(tree.right))
+    elif type(tree) is Universal or type(tree) is Existential:
+        return quantify(type(tree), tree.variable, miniscope(tree.body))
     return tree
 
-# Move all quantifiers as far out as possible, creating a skolemizing map
-def strip_quantifiers(tree):
+def quantify(quantifier, variable, body):
+    if variable not in free_variables(body):
+        return body
+
+    if type(body) is And or type(body) is Or:
+        left, right = body
+        # Universals distribute over And, and existentials over Or
+        if (quantifier is Universal) == (type(body) is And):
+            return type(body)(quantify(quantifier, variable, left), quantify(quantifier, variable, right))
+        elif variable not in free_variables(left):
+            return type(body)(left, quantify(quantifier, variable, right))
+        elif variable not in free_variables(right):
+            return type(body)(quantify(quantifier, variable, left), right)
+
+    return quantifier(variable, body)
+
+# Replace the existentials of an NNF tree by Skolem terms over the
+# universals they are in the scope of, and drop the universals, giving
+# each its own variable
+def skolemize(tree, universals = (), sub = None, used = None):
+    sub = {} if sub is None else sub
+    used = set(free_variables(tree)) if used is None else used
+
     if type(tree) is Universal:
-        skmap, subtree = strip_quantifiers(tree.body)
-        for key in skmap:
-            skmap[key].append(tree.variable)
-        return skmap, subtree
+        variable = tree.variable
+        if variable in used:
+            variable = newvar(symbols.variable_name(variable))
+        used.add(variable)
+        return skolemize(tree.body, universals + (variable,), {**sub, tree.variable: variable}, used)
 
     elif type(tree) is Existential:
-        skmap, subtree = strip_quantifiers(tree.body)
-        skmap[tree.variable] = []
-        return skmap, subtree
+        # A universal may only occur inside the Skolem term of an earlier
+        # existential
+        free = frozenset().union(*(free_variables(substitute(x, sub)) for x in free_variables(tree)))
+        arguments = [x for x in universals if x in free]
+        symbol = newconst(symbols.variable_name(tree.variable))
+        skolem = Functor(symbol, Args(*arguments)) if arguments else symbol
+        return skolemize(tree.body, universals, {**sub, tree.variable: skolem}, used)
 
-    elif type(tree) is int:
-        return {}, tree
-
-    else:
-        results = list(strip_quantifiers(x) for x in tree)
+    elif type(tree) is And or type(tree) is Or:
+        return type(tree)(*(skolemize(x, universals, sub, used) for x in tree))
 
-        # Compile Skolem map
-        skmap = dict(i for result in results for i in result[0].items())
+    return substitute(tree, sub)
 
-        # Compile tree
-        subtree = type(tree)(*(x[1] for x in results))
+# Multiply out a quantifier-free NNF tree, naming the larger operand
+# of a disjunction that would give more than threshold clauses
+def clausify(tree, threshold, definitions, names):
+    if type(tree) is And:
+        return clausify(tree.left, threshold, definitions, names) | clausify(tree.right, threshold, definitions, names)
 
-        return skmap, subtree
+    elif type(tree) is Or:
+        left = clausify(tree.left, threshold, definitions, names)
+        right = clausify(tree.right, threshold, definitions, names)
 
-# CNF a tree of Ands, Ors, and Nots
-def cnf_stripped(tree):
-    if type(tree) is Or:
-        # Expand Ors by Cartesian product
-        return set((l | r) for l in cnf(tree.left) for r in cnf(tree.right))
+        if len(left) > 1 and len(right) > 1 and len(left) * len(right) > threshold:
+            if len(left) > len(right):
+                left, right = right, left
+            right = frozenset(right)
+            if right not in names:
+                # Only ever used positively, so one direction is enough
+                names[right] = atom = definition(all_variables_set(right)[0])
+                definitions.update(clause | {Not(atom)} for clause in right)
+            right = {frozenset({names[right]})}
 
-    elif type(tree) is And:
-        # Expand Ands by union
-        return cnf(tree.left) | cnf(tree.right)
+        return set((l | r) for l in left for r in right)
 
     else:
         return {frozenset({tree})}
 
-def cnf(tree):
-    # Get Skolem map and stripped tree
-    skmap, tree = strip_quantifiers(strip_negation(strip_inference(tree)))
-
-    # Create Skolem functors
-    substitution = {
-            var:
-                Functor(newconst(variables[var]), tuple(skmap[var]))
-                if len(skmap[var]) > 0
-                else newconst(variables[var])
-            for var in skmap
-    }
-
-    # Perform substitution
-    tree = substitute(tree, substitution)
+def cnf(tree, threshold = DEFINITION_THRESHOLD):
+    definitions = []
+    tree = name_equivalences(tree, definitions, {})
 
-    # CNF
-    return cnf_stripped(tree)
+    clauses = set()
+    names = {}
+    for formula in [tree] + definitions:
+        # Definitions made while clausifying go straight into clauses
+        clauses |= clausify(skolemize(miniscope(nnf(formula))), threshold, clauses, names)
+    return clauses
 
 def render_cnf(cnf_expression):
     if len(cnf_expression) == 1:
@@ -270,14 +525,13 @@ def render_cnf(cnf_expression):
     else:
         return ' \u2227 '.join('(%s)' % (' \u2228 '.join(render_tree(x) for x in disjunction)) for disjunction in cnf_expression)
 
-render_prefs = {}
-
 def render_tree(tree):
+    render_prefs = symbols.render_prefs
     if type(tree) is int:
-        if tree in constants:
-            return constants[tree]
-        elif tree in variables:
-            return variables[tree]
+        if tree < 0:
+            return symbols.variable_name(tree)
+        else:
+            return symbols.constants[tree]
 
     elif type(tree) is Or:
         return '[%s] \u2228 [%s]' % (render_tree(tree.left), render_tree(tree.right))
@@ -330,14 +584,7 @@ if __name__ == '__main__':
 
     tree = Universal(a, Existential(b, Iff(Relation(eq, Args(a, b)), Relation(eq, Args(b, a)))))
     print(render_tree(tree))
-    print(render_tree(strip_inference(tree)))
-    print(render_tree(strip_negation(strip_inference(tree))))
-    skmap, tree = strip_quantifiers(strip_negation(strip_inference(tree)))
-
-    # Create Skolem functors
-    substitution = {var: Functor(newconst(variables[var]), tuple(skmap[var])) for var in skmap}
-
-    # Perform substitution
-    utree = substitute(tree, substitution)
-    print(render_tree(utree))
+    print(render_tree(nnf(tree)))
+    print(render_tree(miniscope(nnf(tree))))
+    print(render_tree(skolemize(miniscope(nnf(tree)))))
     print(render_cnf(cnf(tree)))
@@ -0,0 +1,164 @@
+import model
+
+'''
+TERM ORDERINGS: simplification orderings on terms, used to orient
+equalities and to decide which literals of a clause are maximal.
+Functors and relations are compared alike, by their symbol and arguments.
+
+The precedence is a sequence of symbols from smallest to largest. Symbols
+left out of it are smaller than all of those in it, and ordered among
+themselves by their identifiers, so later symbols are larger.
+'''
+
+def is_variable(x):
+    return type(x) is int and x < 0
+
+def same(x, y):
+    return x is y or (type(x) is int and x == y)
+
+def head(term):
+    return term if type(term) is int else term[0]
+
+def arguments(term):
+    return () if type(term) is int else term.arguments
+
+def literal_terms(literal):
+    # A literal as a multiset of terms: s = t is {s, t}, P is {P},
+    # and a negation counts its terms twice, so it is larger.
+    negated = type(literal) is model.Not
+    atom = literal.body if negated else literal
+    if type(atom) is model.Relation and atom.relation == 0:
+        terms = list(atom.arguments)
+    else:
+        terms = [atom]
+    return terms * 2 if negated else terms
+
+class Ordering:
+    def __init__(self, precedence = ()):
+        self.ranks = {symbol: i for i, symbol in enumerate(precedence)}
+
+    def rank(self, symbol):
+        return (1, self.ranks[symbol]) if symbol in self.ranks else (0, symbol)
+
+    def greater(self, s, t):
+        raise NotImplementedError
+
+    def lexicographic(self, ss, ts):
+        for x, y in zip(ss, ts):
+            if not same(x, y):
+                return self.greater(x, y)
+        return len(ss) > len(ts)
+
+    def multiset_greater(self, ms, ns):
+        # Cancel out the terms in common, then every remaining term of ns
+        # has to be dominated by a remaining term of ms
+        ms = list(ms)
+        rest = []
+        for y in ns:
+            for i, x in enumerate(ms):
+                if same(x, y):
+                    del ms[i]
+                    break
+            else:
+                rest.append(y)
+        if len(ms) == 0:
+            return False
+        return all(any(self.greater(x, y) for x in ms) for y in rest)
+
+    def literal_greater(self, l, m):
+        return self.multiset_greater(literal_terms(l), literal_terms(m))
+
+    # Is the literal, after substitution, not smaller than any other
+    # literal of the clause?
+    def maximal(self, literal, clause, sub):
+        literal = model.substitute(literal, sub)
+        return not any(
+            self.literal_greater(model.substitute(other, sub), literal)
+            for other in clause if other is not literal
+        )
+
+'''
+KNUTH-BENDIX ORDERING: compares weights first, then the precedence of
+the head symbols, then the arguments from left to right. Every symbol
+must weigh at least as much as a variable.
+'''
+# Measures are dropped once there are this many
+CACHE_SIZE = 1 << 16
+
+class KBO(Ordering):
+    def __init__(self, precedence = (), weights = None, default_weight = 1, variable_weight = 1):
+        super().__init__(precedence)
+        self.weights = {} if weights is None else weights
+        self.default_weight = default_weight
+        self.variable_weight = variable_weight
+        self.cache = {}
+
+    # The weight and variable occurrence counts of a term
+    def measure(self, term):
+        if term in self.cache:
+            return self.cache[term]
+
+        if type(term) is int:
+            if term < 0:
+                result = (self.variable_weight, {term: 1})
+            else:
+                result = (self.weights.get(term, self.default_weight), {})
+        else:
+            weight = self.weights.get(term[0], self.default_weight)
+            counts = {}
+            for argument in term.arguments:
+                w, c = self.measure(argument)
+                weight += w
+                for x, n in c.items():
+                    counts[x] = counts.get(x, 0) + n
+            result = (weight, counts)
+
+        if len(self.cache) >= CACHE_SIZE:
+            self.cache = {}
+        self.cache[term] = result
+        return result
+
+    def greater(self, s, t):
+        if same(s, t) or is_variable(s):
+            return False
+        if is_variable(t):
+            return t in s.varset if type(s) is not int else False
+
+        s_weight, s_counts = self.measure(s)
+        t_weight, t_counts = self.measure(t)
+
+        # s must have at least as many occurrences of every variable
+        if any(s_counts.get(x, 0) < n for x, n in t_counts.items()):
+            return False
+
+        if s_weight != t_weight:
+            return s_weight > t_weight
+
+        if self.rank(head(s)) != self.rank(head(t)):
+            return self.rank(head(s)) > self.rank(head(t))
+
+        return self.lexicographic(arguments(s), arguments(t))
+
+'''
+LEXICOGRAPHIC PATH ORDERING: s is larger if one of its arguments is at
+least as large as t, or if it dominates every argument of t and has a
+larger head symbol, or the same one with larger arguments.
+'''
+class LPO(Ordering):
+    def greater(self, s, t):
+        if same(s, t) or is_variable(s):
+            return False
+        if is_variable(t):
+            return t in s.varset if type(s) is not int else False
+
+        if any(same(x, t) or self.greater(x, t) for x in arguments(s)):
+            return True
+
+        s_rank = self.rank(head(s))
+        t_rank = self.rank(head(t))
+
+        if s_rank < t_rank:
+            return False
+        if not all(self.greater(s, y) for y in arguments(t)):
+            return False
+        return s_rank > t_rank or self.lexicographic(arguments(s), arguments(t))
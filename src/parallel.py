@@ -0,0 +1,99 @@
+import model
+import ac
+import superposition
+import flatterm
+import concurrent.futures
+
+'''
+PARALLEL INFERENCE: the partners of each new statement are split into
+contiguous chunks, one per worker process, which run the reductions and
+canonicalize the results. The main process merges the chunks back in
+order, so a search makes the same deductions however the work is spread.
+
+Clauses cross between processes as flatterms, which do not depend on the
+symbol tables in model. A worker never makes symbols of its own, so it
+needs no table beyond the AC functors, and leaves canonicalizing the
+results to the main process, which remembers the clauses it has seen.
+The literals of a partner are sent in a fixed order, so that the pairs
+to try can refer to them by position.
+'''
+
+# Don't bother the pool with fewer partners than this
+MIN_BATCH = 8
+
+'''
+WORKERS
+'''
+worker = {}
+
+def initialize(calculus, ordering, ac_operators, selection, max_unifiers):
+    import deduction
+    model.symbols.ac_operators = set(ac_operators)
+    ac.max_unifiers = max_unifiers
+    if calculus == 'superposition':
+        worker['reduce'] = lambda a, b, pairs: superposition.reductions(a, b, ordering, pairs, selection)
+    else:
+        worker['reduce'] = lambda a, b, pairs: deduction.reductions(a, b, pairs, selection)
+
+def reduce_batch(new_statement, batch):
+    new_literals = flatterm.decode_terms(new_statement)
+    b = frozenset(new_literals)
+
+    results = []
+    for statement, pairs in batch:
+        literals = flatterm.decode_terms(statement)
+        pairs = set((literals[i], new_literals[j]) for i, j in pairs)
+        found = []
+        for reduction, note in worker['reduce'](frozenset(literals), b, pairs):
+            found.append((flatterm.encode_clause(reduction), flatterm.encode_note(note)))
+        results.append(found)
+    return results
+
+'''
+POOL
+'''
+class Pool:
+    def __init__(self, workers, calculus, ordering, ac_operators = (), selection = None, max_unifiers = None):
+        self.workers = workers
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers = workers,
+            initializer = initialize,
+            initargs = (calculus, ordering, tuple(ac_operators), selection, max_unifiers)
+        )
+        self.encoded = {}
+
+    def close(self):
+        self.executor.shutdown(cancel_futures = True)
+
+    def forget(self, clause):
+        self.encoded.pop(clause, None)
+
+    def encode(self, clause):
+        if clause not in self.encoded:
+            literals = list(clause)
+            self.encoded[clause] = (literals, flatterm.encode_terms(literals))
+        return self.encoded[clause]
+
+    def inferences(self, new_statement, partners):
+        '''
+        Yield (partner, reduction, note) for a new statement and an ordered
+        list of (partner, literal pairs), in that order.
+        '''
+        new_literals, new_data = self.encode(new_statement)
+        new_position = {x: j for j, x in enumerate(new_literals)}
+
+        batch = []
+        for statement, pairs in partners:
+            literals, data = self.encode(statement)
+            position = {x: i for i, x in enumerate(literals)}
+            batch.append((data, [(position[x], new_position[y]) for x, y in pairs]))
+
+        size = -(-len(batch) // self.workers)
+        chunks = [(i, batch[i:i + size]) for i in range(0, len(batch), size)]
+        futures = [self.executor.submit(reduce_batch, new_data, chunk) for _, chunk in chunks]
+
+        for (start, chunk), future in zip(chunks, futures):
+            for k, found in enumerate(future.result()):
+                statement = partners[start + k][0]
+                for reduction, note in found:
+                    yield statement, flatterm.decode_clause(reduction), flatterm.decode_note(note)
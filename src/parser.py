@@ -1,146 +1,360 @@
 import model
-
-def quantifier(tokens, lang, names):
-    if tokens.peek() == 'forall' or tokens.peek() == 'exists':
-        which = tokens.peek()
-
-        tokens.take()
-
-        var_name = tokens.take()
-        var = model.newvar(var_name)
-        names = names.register(var_name, var)
-
-        tokens.take()
-        body = quantifier(tokens)
-
-        return (model.Universal if which == 'forall' else model.Existential)(var, body)
-
-    else:
-        return inference(tokens, lang, name)
-
-def inference(tokens, lang, names):
-    node = disjunction(tokens, lang, names)
-
-    if tokens.peek() in ('=>', '<=>', 'implies', 'iff'):
-        which = tokens.peek()
-        tokens.take()
-
-        node = (model.Implies if which in ('=>', 'implies') else model.Iff)(
-            inference(tokens, lang, names)
-        )
-
-    return node
-
-def disjunction(tokens, lang, names):
-    node = conjunction(tokens, lang, names)
-
-    if tokens.peek() == 'or':
-        tokens.take()
-        node = model.Or(node, disjunction(tokens, lang, names))
-
-    return node
-
-def conjunction(tokens, lang, names):
-    node = negation(tokens, lang, names)
-
-    if tokens.peek() == 'or':
-        tokens.take()
-        node = model.Or(node, conjunction(tokens, lang, names))
-
-    return node
-
-def negation(tokens, lang, names):
-    if tokens.peek() == 'not':
-        tokens.take()
-        return model.Not(lor_primary(tokens, lang, names))
-    else:
-        return lor_primary(tokens, lang, names)
-
-def lor_primary(tokens, lang, names):
-    if tokens.peek() == '[':
-        tokens.take()
-        node = quantifier(tokens, lang, names)
-        tokens.take()
-        return node
-    else:
-        return term(tokens, lang, names)
-
-def term(tokens, lang, names):
-    return term_infix_relation(tokens, lang, names)
-
-def term_infix_relation(tokens, lang, names, precedence = 0):
-    if precedence >= len(lang.relation_infix_order):
-        return term_functional_relation(tokens, lang, names)
-    else:
-        node = term_infix_relation(tokens, lang, names, precedence = precedence + 1)
-
-        if tokens.peek() == lang.relation_infix_order[precedence]:
-            operator = lang.relation_infix_order[precedence]
-            constant = names.to_index(operator)
-
-            return model.Relation(constant, model.Args(
-                node,
-                term_infix_relation(tokens, lang, names, precedence = precedence)
-            ))
-
-        return node
-
-def term_functional_relation(tokens, lang, names):
-    functor = value(tokens, lang, names)
-
-    arguments = []
-    if tokens.peek() == '[':
-        tokens.take()
-        while True:
-            arguments.append(term(tokens, lang, names))
-            if tokens.peek() != ',':
-                break
-        return model.Relation(functor, model.Args(*arguments))
-
-    return functor
-
-def value(tokens, lang, names):
-    return value_infix(tokens, lang, names)
-
-def value_infix(tokens, lang, names, precedence = 0)
-    if precedence >= len(lang.functor_infix_order):
-        return value_functional(tokens, lang, names)
+import re
+
+'''
+PARSER: statements as text, each ended by a semicolon, read one at a time
+from any iterable of lines, like an open file, so that a file of axioms
+never has to be held in memory whole.
+
+    formula   forall x y. formula | exists x. formula
+              formula <=> formula
+              formula => formula
+              formula or formula | formula and formula | not formula
+              [formula] | atom
+    atom      term = term | P[term, ...] | P(term, ...) | P
+    term      term + term | term * term | f(term, ...) | (term) | name
+
+from the loosest to the tightest. Every binary operator is right
+associative, and a quantifier takes in everything to its right, up to
+the bracket it is in. The connectives can also be written as model
+renders them, or as ~ & | -- and # comments out the rest of a line.
+A Language gives the infix relations and functors, and their order.
+
+Names are the symbols of the table in scope, made as they are first met,
+and every name bound by no quantifier is a constant. In a clause file,
+which is read by clauses, each statement is a disjunction of literals
+whose names starting with a lower case letter are its variables, as
+render_cnf writes them, and it is taken as a clause as it is, without
+going through model.cnf.
+
+Parsing is iterative, by operator precedence, so that there is no limit
+to how deep a formula may be.
+'''
+
+class ParseError(ValueError):
+    pass
+
+# Tokens other than names, as written, and as the parser knows them
+SYMBOLS = {
+    '(': '(', ')': ')', '[': '[', ']': ']', ',': ',', '.': '.', ';': ';',
+    '∀': 'forall', '∃': 'exists',
+    '~': 'not', '¬': 'not',
+    '&': 'and', '∧': 'and',
+    '|': 'or', '∨': 'or',
+    '=>': '=>', '⇒': '=>',
+    '<=>': '<=>', '⇔': '<=>',
+}
+
+KEYWORDS = {
+    'forall': 'forall', 'exists': 'exists', 'not': 'not', 'and': 'and',
+    'or': 'or', 'implies': '=>', 'iff': '<=>',
+}
+
+QUANTIFIERS = {'forall': model.Universal, 'exists': model.Existential}
+
+# Connectives by precedence, with how to build them; <=> is the loosest,
+# so a => b <=> c is [a => b] <=> c
+CONNECTIVES = {'<=>': (1, model.Iff), '=>': (2, model.Implies), 'or': (3, model.Or), 'and': (4, model.And)}
+NEGATION = 5
+QUANTIFIER = 0
+
+class Language:
+    def __init__(self, relation_infix_order = ('=',), functor_infix_order = ('+', '*')):
+        '''
+        The infix relations and functors, each from the loosest to the
+        tightest; every relation is looser than every functor.
+        '''
+        self.relation_infix_order = tuple(relation_infix_order)
+        self.functor_infix_order = tuple(functor_infix_order)
+
+        self.symbols = dict(SYMBOLS)
+        self.infix = {}
+        for i, operator in enumerate(self.relation_infix_order + self.functor_infix_order):
+            self.symbols[operator] = operator
+            self.infix[operator] = (NEGATION + 1 + i, operator in self.relation_infix_order)
+        # Names come first, so that an alphabetic symbol is only ever a
+        # whole word, and of the rest the longest symbol that matches is
+        # taken, so => is not = then >
+        alternatives = sorted(self.symbols, key = len, reverse = True)
+        self.pattern = re.compile(r"\s+|#.*|([\w']+)|(%s)|(.)" % ('|'.join(map(re.escape, alternatives)),))
+        self.special = set(self.symbols.values()) | set(KEYWORDS.values())
+
+DEFAULT_LANGUAGE = Language()
+
+class Tokens:
+    '''
+    The tokens of lines, as the parser knows them, a line at a time.
+    '''
+    def __init__(self, lines, language = DEFAULT_LANGUAGE):
+        self.language = language
+        self.lines = iter(lines)
+        self.line = 0
+        # Those of the current line still to come, last first
+        self.pending = []
+
+    def split(self, line):
+        symbols = self.language.symbols
+        result = []
+        for name, symbol, error in self.language.pattern.findall(line):
+            if name:
+                result.append(symbols[name] if name in symbols else KEYWORDS.get(name, name))
+            elif symbol:
+                result.append(symbols[symbol])
+            elif error:
+                raise self.error('unexpected %r' % (error,))
+        result.reverse()
+        return result
+
+    def peek(self):
+        while not self.pending:
+            line = next(self.lines, None)
+            if line is None:
+                return None
+            self.line += 1
+            self.pending = self.split(line)
+        return self.pending[-1]
+
+    def take(self):
+        token = self.peek()
+        if token is not None:
+            self.pending.pop()
+        return token
+
+    def error(self, message):
+        return ParseError('line %d: %s' % (self.line, message))
+
+class Names:
+    '''
+    The symbols of names, in the table in scope when made, and the names
+    that quantifiers bind where the parser is. Given free, a dict, names
+    starting with a lower case letter that nothing binds are variables,
+    numbered as they are first met.
+    '''
+    def __init__(self, table = None):
+        self.table = model.symbols if table is None else table
+        self.constants = {'=': 0}
+        self.variables = {}
+        self.bound = {}
+        self.free = None
+
+    def constant(self, name):
+        result = self.constants.get(name)
+        if result is None:
+            result = self.constants[name] = self.table.newconst(name)
+        return result
+
+    # The symbol of an infix operator, rendered as one
+    def operator(self, name):
+        result = self.constant(name)
+        self.table.render_prefs[result] = 'infix'
+        return result
+
+    # Quantifiers reuse the variable of a name, which model.cnf renames
+    # where it is bound twice
+    def bind(self, name):
+        if name not in self.variables:
+            self.variables[name] = self.table.newvar(name)
+        self.bound[name] = self.bound.get(name, 0) + 1
+        return self.variables[name]
+
+    def unbind(self, name):
+        self.bound[name] -= 1
+
+    def lookup(self, name):
+        if self.bound.get(name):
+            return self.variables[name]
+        if self.free is not None and name[0].islower():
+            if name not in self.free:
+                self.free[name] = -len(self.free) - 1
+            return self.free[name]
+        return self.constant(name)
+
+'''
+BUILDING: the operands of connectives are formulas, in which a term
+stands for an atom, and those of infix operators and applications are
+terms.
+'''
+def formula(x, tokens):
+    if type(x) is int:
+        if x < 0:
+            raise tokens.error('a variable, %s, is not a formula' % (model.symbols.variable_name(x),))
+        return model.Relation(x, model.Args())
+    if type(x) is model.Functor:
+        return model.Relation(x.functor, x.arguments)
+    return x
+
+def term(x, tokens):
+    if type(x) is not int and type(x) is not model.Functor:
+        raise tokens.error('%s is not a term' % (model.render_tree(x),))
+    return x
+
+# Apply the operator on top of the stack to its operands
+def reduce(operators, output, tokens, names):
+    kind, precedence, payload = operators.pop()
+    if kind == 'binary':
+        right = output.pop()
+        left = output.pop()
+        build, symbol = payload
+        if symbol is None:
+            output.append(build(formula(left, tokens), formula(right, tokens)))
+        else:
+            output.append(build(symbol, model.Args(term(left, tokens), term(right, tokens))))
+    elif kind == 'not':
+        output.append(model.Not(formula(output.pop(), tokens)))
     else:
-        node = value_infix(tokens, lang, names, precedence = precedence + 1)
-
-        if tokens.peek() == lang.functor_infix_order[precedence]:
-            operator = lang.functor_infix_order[precedence]
-            constant = names.to_index(operator)
-
-            return model.Functor(constant, model.Args(
-                node,
-                value_infix(tokens, lang, names, precedence = precedence)
-            ))
-
-        return node
-
-def value_functional(tokens, lang, names):
-    functor = value_primary(tokens, lang, names)
-
-    arguments = []
-    if tokens.peek() == '(':
+        quantifier, bound = payload
+        body = formula(output.pop(), tokens)
+        for name, variable in reversed(bound):
+            body = quantifier(variable, body)
+            names.unbind(name)
+        output.append(body)
+
+# Apply every operator down to the innermost bracket, if any
+def reduce_all(operators, output, tokens, names):
+    while operators and operators[-1][0] not in ('group', 'apply'):
+        reduce(operators, output, tokens, names)
+
+def statement(tokens, names, language = DEFAULT_LANGUAGE):
+    '''
+    The next statement, as it is written, up to its semicolon or the end
+    of the lines, or None if there is none.
+    '''
+    while tokens.peek() == ';':
         tokens.take()
-        while True:
-            arguments.append(value(tokens, lang, names))
-            if tokens.peek() != ',':
-                break
-        return model.Functor(functor, model.Args(*arguments))
-
-    return functor
-
-def value_primary(tokens, lang, names):
-    if tokens.peek() == '(':
-        tokens.take()
-        node = value(tokens)
-        tokens.take()
-        return node
-    else:
-        return value_atomic(tokens)
-
-def value_atomic(tokens, lang, names):
-    return names.to_index(tokens.take())
+    if tokens.peek() is None:
+        return None
+
+    output = []
+    # Operators as (kind, precedence, payload), and open brackets as
+    # ('group' or 'apply', closing bracket, how many operands are below)
+    operators = []
+    operand = True
+    while True:
+        token = tokens.take()
+        if operand:
+            if token is None or token == ';':
+                raise tokens.error('unexpected end of statement')
+            elif token not in language.special:
+                if tokens.peek() == '(' or tokens.peek() == '[':
+                    bracket = tokens.take()
+                    operators.append(('apply', ')' if bracket == '(' else ']', (names.constant(token), len(output))))
+                    if tokens.peek() in (')', ']'):
+                        operand = False
+                    continue
+                output.append(names.lookup(token))
+                operand = False
+            elif token == '(' or token == '[':
+                operators.append(('group', ')' if token == '(' else ']', len(output)))
+            elif token == 'not':
+                operators.append(('not', NEGATION, None))
+            elif token in QUANTIFIERS:
+                bound = []
+                while tokens.peek() != '.':
+                    name = tokens.take()
+                    if name is None or name in language.special:
+                        raise tokens.error('expected a variable, not %r' % (name,))
+                    bound.append((name, names.bind(name)))
+                tokens.take()
+                if not bound:
+                    raise tokens.error('%s binds nothing' % (token,))
+                operators.append(('quantifier', QUANTIFIER, (QUANTIFIERS[token], bound)))
+            else:
+                raise tokens.error('unexpected %r' % (token,))
+            continue
+
+        if token in CONNECTIVES or token in language.infix:
+            if token in CONNECTIVES:
+                precedence, build = CONNECTIVES[token]
+                payload = (build, None)
+            else:
+                precedence, relation = language.infix[token]
+                payload = (model.Relation if relation else model.Functor, names.operator(token))
+            # Every binary operator is right associative
+            while operators and operators[-1][0] not in ('group', 'apply') and operators[-1][1] > precedence:
+                reduce(operators, output, tokens, names)
+            operators.append(('binary', precedence, payload))
+            operand = True
+        elif token == ',':
+            reduce_all(operators, output, tokens, names)
+            if not operators or operators[-1][0] != 'apply':
+                raise tokens.error('unexpected ,')
+            operand = True
+        elif token == ')' or token == ']':
+            reduce_all(operators, output, tokens, names)
+            if not operators or operators[-1][1] != token:
+                raise tokens.error('unexpected %r' % (token,))
+            kind, _, payload = operators.pop()
+            if kind == 'apply':
+                symbol, height = payload
+                arguments = model.Args(*(term(x, tokens) for x in output[height:]))
+                del output[height:]
+                output.append((model.Relation if token == ']' else model.Functor)(symbol, arguments))
+        elif token is None or token == ';':
+            reduce_all(operators, output, tokens, names)
+            if operators:
+                raise tokens.error('%r is never closed' % ('(' if operators[-1][1] == ')' else '[',))
+            return output.pop()
+        else:
+            raise tokens.error('unexpected %r' % (token,))
+
+# The literals of a disjunction, without building it
+def literals(tree, tokens):
+    result = []
+    stack = [tree]
+    while stack:
+        x = stack.pop()
+        if type(x) is model.Or:
+            stack.append(x.right)
+            stack.append(x.left)
+            continue
+        negated = type(x) is model.Not
+        atom = formula(x.body if negated else x, tokens)
+        if type(atom) is not model.Relation:
+            raise tokens.error('%s is not a literal' % (model.render_tree(x),))
+        result.append(model.Not(atom) if negated else atom)
+    return frozenset(result)
+
+'''
+READING
+'''
+def formulas(lines, language = DEFAULT_LANGUAGE, names = None):
+    '''
+    Each statement of lines, as a tree.
+    '''
+    names = Names() if names is None else names
+    tokens = Tokens(lines, language)
+    while True:
+        tree = statement(tokens, names, language)
+        if tree is None:
+            return
+        yield formula(tree, tokens)
+
+def cnf(lines, language = DEFAULT_LANGUAGE, names = None):
+    '''
+    The clauses of the statements of lines, as model.cnf gives them, a
+    statement at a time.
+    '''
+    for tree in formulas(lines, language, names):
+        yield from model.cnf(tree)
+
+def clauses(lines, language = DEFAULT_LANGUAGE, names = None):
+    '''
+    Each statement of a clause file, as a clause.
+    '''
+    names = Names() if names is None else names
+    tokens = Tokens(lines, language)
+    while True:
+        names.free = {}
+        tree = statement(tokens, names, language)
+        if tree is None:
+            return
+        yield literals(tree, tokens)
+
+def parse(text, language = DEFAULT_LANGUAGE, names = None):
+    '''
+    The one formula in text.
+    '''
+    found = list(formulas(text.splitlines(), language, names))
+    if len(found) != 1:
+        raise ParseError('expected one formula, not %d' % (len(found),))
+    return found[0]
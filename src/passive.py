@@ -0,0 +1,74 @@
+import heapq
+
+'''
+PASSIVE SET: statements that are known to be true but have not yet been
+selected into the canon. Every statement sits in several priority queues
+at once, each ordering them differently, and a pick ratio decides which
+queue each selection comes from:
+
+    'age'     first in, first out
+    'weight'  the cost given when pushing, lowest first
+    'goal'    distance from the negated goal, then cost
+
+Deletion is lazy: a discarded statement stays in the heaps and is skipped
+when it reaches the top of one.
+'''
+
+# The occasional pick by age keeps the search fair; the rest mostly
+# follow the goal, which pays off on the arithmetic problems.
+DEFAULT_RATIO = (('age', 1), ('goal', 5), ('weight', 20))
+
+# The queues a ratio can pick from
+QUEUES = ('age', 'weight', 'goal')
+
+class PassiveSet:
+    def __init__(self, ratio = DEFAULT_RATIO):
+        # e.g. (('age', 1), ('weight', 5)) picks once by age for every
+        # five times by weight
+        for name, count in ratio:
+            if name not in QUEUES:
+                raise ValueError('no queue %r; there are %s' % (name, ', '.join(QUEUES)))
+        self.schedule = [name for name, count in ratio for _ in range(count)]
+        if not self.schedule:
+            raise ValueError('ratio %r never picks from any queue' % (ratio,))
+        self.queues = {name: [] for name in self.schedule}
+        self.members = set()
+        self.age = 0
+        self.tick = 0
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, statement):
+        return statement in self.members
+
+    def push(self, statement, **priorities):
+        age = self.age
+        self.age += 1
+        priorities['age'] = age
+        self.members.add(statement)
+        for name, queue in self.queues.items():
+            # The age breaks ties, so that equal priorities come out in order
+            heapq.heappush(queue, (priorities[name], age, statement))
+
+    def discard(self, statement):
+        self.members.discard(statement)
+
+    def pop_from(self, name):
+        queue = self.queues[name]
+        while queue:
+            _, _, statement = heapq.heappop(queue)
+            if statement in self.members:
+                self.members.remove(statement)
+                return statement
+        return None
+
+    def pop(self):
+        # Every member is in every queue, so some queue will have it
+        while self.members:
+            name = self.schedule[self.tick % len(self.schedule)]
+            self.tick += 1
+            statement = self.pop_from(name)
+            if statement is not None:
+                return statement
+        return None
@@ -0,0 +1,109 @@
+import model
+import deduction
+import orderings
+import scoring
+import math
+import multiprocessing
+import queue
+import time
+
+'''
+PORTFOLIO: race several strategies for the same problem, each in its own
+process with its own time budget, and take the first proof. A strategy
+is (name, budget in seconds or None, options for deduction.prove), so
+anything prove takes -- scorer, h, max_cost, ratio, ordering, calculus --
+can vary between them.
+
+Workers are forked, so heuristics and orderings need not be picklable,
+but the winning proof comes back through a queue, along with the symbol
+table it was made with, whose new symbols -- the Skolem functions of the
+negated goal -- are then added to the table in scope.
+'''
+
+# Scorers, as weights of (symbols, variables, depth, literals)
+
+# Short clauses first: every literal past the first costs extra
+SHORT = scoring.Scorer((10, 30, 0, 100), bias = -100)
+
+# Shallow clauses first
+SHALLOW = scoring.Scorer((10, 30, 50, 0))
+
+DEFAULT_PORTFOLIO = (
+    ('default', 60, {}),
+    ('lpo', 60, {'ordering': orderings.LPO()}),
+    ('short', 60, {'scorer': SHORT}),
+    ('shallow', 60, {'scorer': SHALLOW, 'max_cost': 2000}),
+    ('weight', 60, {'ratio': (('age', 1), ('weight', 5))}),
+    ('unrestricted', 60, {'calculus': 'unrestricted'}),
+)
+
+# Put (index of the strategy, proof, table) on results
+def run(i, strategy, axioms, statement, results):
+    name, budget, options = strategy
+    # The workers would all draw over the same line
+    deduction.progress_log = lambda *args: None
+    try:
+        proof = deduction.prove(axioms, statement, **options)
+    except Exception:
+        results.put((i, None, None))
+        raise
+    results.put((i, proof, model.symbols if proof is not None else None))
+
+def adopt(table):
+    model.symbols.constants.update(table.constants)
+    model.symbols.variables.update(table.variables)
+
+def race(axioms, statement, strategies = DEFAULT_PORTFOLIO, processes = None):
+    '''
+    Prove statement from axioms with each of the strategies, at most
+    processes of them at once, in the order given. Returns the name of
+    the first strategy to find a proof and its proof map, or
+    (None, None) if every strategy saturates, fails or runs out of time.
+    '''
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = min(len(strategies), multiprocessing.cpu_count()) if processes is None else processes
+
+    # By index, since names need not be unique
+    pending = list(enumerate(strategies))
+    running = {}
+    try:
+        while pending or running:
+            while pending and len(running) < processes:
+                i, strategy = pending.pop(0)
+                _, budget, _ = strategy
+                process = context.Process(target = run, args = (i, strategy, axioms, statement, results), daemon = True)
+                process.start()
+                running[i] = (process, math.inf if budget is None else time.monotonic() + budget)
+
+            # Wake up for the next deadline, or at least every second to
+            # notice workers that were killed before they could answer
+            timeout = min(deadline for _, deadline in running.values()) - time.monotonic()
+            try:
+                i, proof, table = results.get(timeout = min(max(timeout, 0), 1))
+            except queue.Empty:
+                now = time.monotonic()
+                for i, (process, deadline) in list(running.items()):
+                    if now >= deadline or process.exitcode not in (None, 0):
+                        deduction.debug_print('strategy', strategies[i][0], 'stopped')
+                        process.terminate()
+                        process.join()
+                        del running[i]
+                continue
+
+            # A strategy may answer just before it is stopped for its
+            # deadline, and then it no longer counts
+            if i not in running:
+                continue
+            process, _ = running.pop(i)
+            process.join()
+            if proof is not None:
+                adopt(table)
+                return strategies[i][0], proof
+    finally:
+        for process, _ in running.values():
+            process.terminate()
+        for process, _ in running.values():
+            process.join()
+
+    return None, None
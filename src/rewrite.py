@@ -0,0 +1,153 @@
+import model
+import index
+import ac
+
+'''
+DEMODULATION: unit equalities of the canon become rewrite rules, oriented
+by a term ordering, and every new statement is rewritten to normal form
+before it is pushed. An equality the ordering cannot orient, like
+commutativity, is kept both ways round and only applied to instances
+where it makes the term smaller.
+
+Rules match modulo AC, and rewrite part of a sum by extension, as in ac.
+The normal form of every subterm is cached, keyed on the interned term,
+until the rules change.
+'''
+
+def is_tautology(clause):
+    for literal in clause:
+        if index.is_equality(literal) and literal.arguments[0] == literal.arguments[1]:
+            return True
+        if type(literal) is not model.Not and model.Not(literal) in clause:
+            return True
+    return False
+
+class Demodulator:
+    def __init__(self, ordering):
+        self.ordering = ordering
+        # Left-hand sides of the rules, to be matched against subterms
+        self.rules = index.DiscriminationTree()
+        self.clauses = {}
+        self.cache = {}
+
+    def orientations(self, clause):
+        # (source, target, oriented) for each way round a rule can be used
+        if len(clause) != 1:
+            return []
+        literal = next(iter(clause))
+        if not index.is_equality(literal):
+            return []
+
+        l, r = literal.arguments
+        if self.ordering.greater(l, r):
+            return [(l, r, True)]
+        elif self.ordering.greater(r, l):
+            return [(r, l, True)]
+        else:
+            # A variable would match anything, and is never the larger side
+            return [(s, t, False) for s, t in ((l, r), (r, l)) if not model.is_variable(s)]
+
+    def add(self, clause):
+        '''
+        Use the clause as a rule, if it is a unit equality; True if it is.
+        '''
+        rules = self.orientations(clause)
+        if rules:
+            self.clauses[clause] = rules
+            for source, target, oriented in rules:
+                self.rules.insert(source, (clause, source, target, oriented))
+            self.cache.clear()
+        return len(rules) > 0
+
+    def remove(self, clause):
+        if clause in self.clauses:
+            for source, target, oriented in self.clauses.pop(clause):
+                self.rules.remove(source, (clause, source, target, oriented))
+            self.cache.clear()
+
+    # Rewrite the term at its root, if some rule other than exclude applies
+    def rewrite_root(self, term, exclude = None):
+        op = ac.operator(term)
+        for _, (clause, source, target, oriented) in self.rules.retrieve(term, 'generalizations'):
+            if clause == exclude:
+                continue
+            forms = [(source, target)]
+            if op is not None and ac.operator(source) == op:
+                forms.append(ac.extend(source, target, op))
+            for source, target in forms:
+                # Simplifying is optional, so the first matcher will do
+                sub = next(ac.matches(source, term), None)
+                if sub is None:
+                    continue
+                result = ac.normalize(model.substitute(target, sub))
+                if oriented or self.ordering.greater(term, result):
+                    return result, (clause, source, target, sub)
+        return None
+
+    def normal_form(self, term, exclude = None):
+        '''
+        The normal form of a term, and the (rule, source, target, matcher)
+        steps that lead to it, innermost first. The rules from the clause
+        exclude are not used, and the cache only holds normal forms under
+        all the rules.
+        '''
+        if exclude is None and term in self.cache:
+            return self.cache[term]
+
+        if type(term) is int:
+            if term < 0:
+                return term, []
+            normal, steps = term, []
+        else:
+            steps = []
+            arguments = []
+            for argument in term.arguments:
+                normal, argument_steps = self.normal_form(argument, exclude)
+                arguments.append(normal)
+                steps.extend(argument_steps)
+            normal = ac.normalize(type(term)(term[0], model.Args(*arguments))) if steps else term
+
+        # Relations are never rewritten as a whole
+        if type(normal) is not model.Relation:
+            rewritten = self.rewrite_root(normal, exclude)
+            if rewritten is not None:
+                result, step = rewritten
+                normal, result_steps = self.normal_form(result, exclude)
+                steps = steps + [step] + result_steps
+
+        if exclude is None:
+            self.cache[term] = (normal, steps)
+        return normal, steps
+
+    def normalize(self, clause):
+        '''
+        Rewrite every literal of the clause to normal form. Returns the
+        rewritten clause and the steps taken, which are empty if nothing
+        changed. A rule never rewrites its own clause.
+        '''
+        if len(self.clauses) == 0:
+            return clause, []
+
+        exclude = clause if clause in self.clauses else None
+
+        steps = []
+        literals = []
+        for literal in clause:
+            negated = type(literal) is model.Not
+            normal, literal_steps = self.normal_form(literal.body if negated else literal, exclude)
+            literals.append(model.Not(normal) if negated else normal)
+            steps.extend(literal_steps)
+
+        return (frozenset(literals) if steps else clause), steps
+
+    def rewritable(self, canon_index, clause):
+        '''
+        The statements of a clause index that the rules from this clause
+        can rewrite, other than itself.
+        '''
+        candidates = set()
+        for source, target, oriented in self.clauses.get(clause, ()):
+            for _, (statement, literal) in canon_index.sites.retrieve(source, 'instances'):
+                if statement != clause:
+                    candidates.add(statement)
+        return [x for x in candidates if self.normalize(x)[1]]
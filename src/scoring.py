@@ -0,0 +1,106 @@
+import model
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+'''
+SCORING: the cost of a clause as a function of its features
+
+    symbols     occurrences of functors, constants and relations
+    variables   occurrences of variables
+    depth       nesting of the deepest literal, its relation included
+    literals    how many literals it has
+
+which are counted once for each interned term and cached, and, for a
+clause that is still to be substituted by a unifier, added up without
+substituting it. A Scorer scores a whole batch of clauses at once: as one
+matrix product with NumPy, if it is installed, or row by row without.
+'''
+
+# As ten times the weight of its flatterm
+DEFAULT_WEIGHTS = (10, 30, 0, 0)
+
+# Features of terms are dropped once there are this many
+CACHE_SIZE = 1 << 16
+
+cache = {}
+
+# (symbols, variables, depth) of a term
+def term_features(term):
+    if type(term) is int:
+        return (0, 1, 0) if term < 0 else (1, 0, 0)
+    result = cache.get(term)
+    if result is None:
+        if len(cache) >= CACHE_SIZE:
+            cache.clear()
+        if type(term) is model.Not:
+            result = term_features(term.body)
+        else:
+            symbols, variables, depth = 1, 0, 0
+            for x in term.arguments:
+                s, v, d = term_features(x)
+                symbols += s
+                variables += v
+                depth = max(depth, d)
+            result = (symbols, variables, depth + 1)
+        cache[term] = result
+    return result
+
+# The same, of a term substituted by sub, which has to be idempotent, as
+# unifiers are
+def substituted_features(term, sub):
+    if type(term) is int:
+        return term_features(sub[term] if term in sub else term)
+    if term.varset.isdisjoint(sub):
+        return term_features(term)
+    if type(term) is model.Not:
+        return substituted_features(term.body, sub)
+    symbols, variables, depth = 1, 0, 0
+    for x in term.arguments:
+        s, v, d = substituted_features(x, sub)
+        symbols += s
+        variables += v
+        depth = max(depth, d)
+    return (symbols, variables, depth + 1)
+
+def features(literals, sub = None):
+    '''
+    The features of a clause, given as its literals, substituted by sub
+    if given, as a row: (symbols, variables, depth, literals).
+    '''
+    symbols, variables, depth = 0, 0, 0
+    for literal in literals:
+        s, v, d = term_features(literal) if sub is None else substituted_features(literal, sub)
+        symbols += s
+        variables += v
+        depth = max(depth, d)
+    return (symbols, variables, depth, len(literals))
+
+class Scorer:
+    '''
+    Scores rows of features by weights, one for each feature, plus bias,
+    or by function, which is given a batch of rows -- a NumPy array, if
+    NumPy is installed, or else a list of tuples -- and returns their
+    scores.
+    '''
+    def __init__(self, weights = DEFAULT_WEIGHTS, bias = 0, function = None):
+        self.weights = tuple(weights)
+        self.bias = bias
+        self.function = function
+        if numpy is not None:
+            self.vector = numpy.array(self.weights)
+
+    def scores(self, rows):
+        if not rows:
+            return []
+        if numpy is not None:
+            rows = numpy.array(rows)
+            return list(self.function(rows) if self.function is not None else (rows @ self.vector + self.bias).tolist())
+        if self.function is not None:
+            return list(self.function(rows))
+        return [sum(w * x for w, x in zip(self.weights, row)) + self.bias for row in rows]
+
+    def score(self, clause):
+        return self.scores([features(clause)])[0]
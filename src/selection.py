@@ -0,0 +1,29 @@
+import model
+
+'''
+LITERAL SELECTION: a selection function picks from a clause the literal
+that inferences with the clause are restricted to, or None. A clause
+with a selected literal takes part in reductions, superpositions and
+equality resolutions only through it, maximal or not, and so is never
+the source of a superposition; a clause with nothing selected takes part
+through its maximal literals, as before. Only negative literals are
+picked, which keeps superposition complete.
+
+Ties are broken by hash, which does not depend on how the clause was
+built, so the same literal is picked from a clause every time.
+'''
+
+def negative(clause):
+    '''
+    The largest negative literal of the clause, if it has one.
+    '''
+    result = None
+    for literal in clause:
+        if type(literal) is model.Not and (result is None or
+                (literal.size, hash(literal)) > (result.size, hash(result))):
+            result = literal
+    return result
+
+# Whether a clause is positive, as the electrons of a hyperresolution are
+def positive(clause):
+    return not any(type(literal) is model.Not for literal in clause)
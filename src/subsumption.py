@@ -0,0 +1,91 @@
+import model
+import index
+
+'''
+SUBSUMPTION: a clause c subsumes d if some substitution of the variables
+of c alone makes it a subset of d. Then d says nothing that c does not,
+and can be thrown away. c must have no more literals than d, or else a
+clause would subsume its own factors, like P(x) | P(y) does P(x).
+'''
+def subsumes(c, d):
+    if len(c) > len(d):
+        return False
+    # Try the most specific literals first, since they have the fewest matches
+    literals = sorted(c, key = lambda x: -len(index.preorder(x)))
+
+    def search(i, sub):
+        if i == len(literals):
+            return True
+        for literal in d:
+            extended = model.match(literals[i], literal, sub)
+            if extended is not None and search(i + 1, extended):
+                return True
+        return False
+
+    return search(0, {})
+
+# Every symbol that occurs in the clause, with the sign of its literal.
+# If c subsumes d, the features of c are a subset of those of d.
+def features(clause):
+    result = set()
+    for literal in clause:
+        negated = type(literal) is model.Not
+        for key in index.preorder(literal.body if negated else literal):
+            if key is not None:
+                result.add((negated, key))
+    return frozenset(result)
+
+class SubsumptionIndex:
+    def __init__(self):
+        self.features = {}
+        # Each clause stored under its most specific literal, for forward checks
+        self.heads = index.DiscriminationTree()
+        # Every literal of every clause, for backward checks
+        self.literals = index.DiscriminationTree()
+
+    def head(self, clause):
+        return max(clause, key = lambda x: len(index.preorder(x)))
+
+    def add(self, clause):
+        self.features[clause] = features(clause)
+        self.heads.insert(self.head(clause), clause)
+        for literal in clause:
+            self.literals.insert(literal, clause)
+
+    def remove(self, clause):
+        del self.features[clause]
+        self.heads.remove(self.head(clause), clause)
+        for literal in clause:
+            self.literals.remove(literal, clause)
+
+    def subsumer(self, clause, exclude = ()):
+        '''
+        Some stored clause, not in exclude, that subsumes this one, or None.
+        '''
+        if len(clause) == 0:
+            return frozenset() if frozenset() in self.features and frozenset() not in exclude else None
+
+        clause_features = features(clause)
+        for literal in clause:
+            for _, candidate in self.heads.retrieve(literal, 'generalizations'):
+                if (candidate not in exclude and
+                        self.features[candidate] <= clause_features and
+                        subsumes(candidate, clause)):
+                    return candidate
+        return None
+
+    def subsumed(self, clause):
+        '''
+        All the stored clauses, other than this one, that it subsumes.
+        '''
+        if len(clause) == 0:
+            return [x for x in self.features if x != clause]
+
+        clause_features = features(clause)
+        head = self.head(clause)
+
+        candidates = set(x for _, x in self.literals.retrieve(head, 'instances'))
+        return [
+            x for x in candidates
+            if x != clause and clause_features <= self.features[x] and subsumes(clause, x)
+        ]
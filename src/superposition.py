@@ -0,0 +1,189 @@
+import model
+import index
+import ac
+
+'''
+SUPERPOSITION: paramodulation restricted by a term ordering. Equalities
+are only used from their side that is not smaller, only into positions
+that are not variables and, in an equality, only into its side that is
+not smaller. Both partners have to be maximal in their clauses after
+unification, and binary reduction on other literals is ordered the same way.
+
+Unification is modulo AC, and an equation rewrites into part of a sum by
+extension, as in ac.
+
+Given a selection function, as in selection, a clause with a selected
+literal takes part only through that literal, which need not be maximal.
+
+Equality resolution, equality factoring and factoring are the
+inferences of a clause on its own.
+'''
+
+# Can a literal of a clause, whose selected literal is selected or None,
+# take part in an inference under sub?
+def eligible(literal, clause, selected, sub, ordering):
+    if selected is not None:
+        return literal is selected
+    return ordering.maximal(literal, clause, sub)
+
+# Rewrite one non-variable subterm of term that unifies with source
+def rewrites(term, source, target):
+    if type(term) is int:
+        if term >= 0:
+            for sub in ac.unifiers(term, source):
+                yield target, sub
+        return
+
+    op = ac.operator(term)
+    if op is not None:
+        for sub in ac.unifiers(term, source):
+            yield target, sub
+        if ac.operator(source) == op:
+            extended_source, extended_target = ac.extend(source, target, op)
+            for sub in ac.unifiers(term, extended_source):
+                yield extended_target, sub
+
+        parts = ac.leaves(term, op)
+        for i, part in enumerate(parts):
+            for rewritten, sub in rewrites(part, source, target):
+                yield ac.build(op, parts[:i] + [rewritten] + parts[i + 1:]), sub
+        return
+
+    if type(term) is model.Functor:
+        for sub in ac.unifiers(term, source):
+            yield target, sub
+
+    for i, argument in enumerate(term.arguments):
+        for rewritten, sub in rewrites(argument, source, target):
+            yield type(term)(term[0], model.Args(*(
+                rewritten if j == i else x for j, x in enumerate(term.arguments)
+            ))), sub
+
+def superpose_into(literal, source, target, ordering):
+    negated = type(literal) is model.Not
+    atom = literal.body if negated else literal
+    wrap = model.Not if negated else (lambda x: x)
+
+    if not index.is_equality(atom):
+        for rewritten, sub in rewrites(atom, source, target):
+            yield wrap(rewritten), sub
+        return
+
+    # Only rewrite into the side of an equality that is not smaller
+    s, t = atom.arguments
+    for side, other, rebuild in (
+            (s, t, lambda x: model.Relation(0, model.Args(x, t))),
+            (t, s, lambda x: model.Relation(0, model.Args(s, x)))):
+        for rewritten, sub in rewrites(side, source, target):
+            if not ordering.greater(model.substitute(other, sub), model.substitute(side, sub)):
+                yield wrap(rebuild(rewritten)), sub
+
+# selected is the selected literal of each clause, or None
+def superpositions(from_clause, equality, into_clause, literal, ordering, selected = (None, None)):
+    for source, target in (equality.arguments, reversed(equality.arguments)):
+        for rewritten, sub in superpose_into(literal, source, target, ordering):
+            if (not ordering.greater(model.substitute(target, sub), model.substitute(source, sub)) and
+                    eligible(equality, from_clause, selected[0], sub, ordering) and
+                    eligible(literal, into_clause, selected[1], sub, ordering)):
+                yield rewritten, sub, (source, target)
+
+def inferences(a, b, ordering, pairs = None, selection = None):
+    '''
+    The superposition counterpart of deduction.inferences.
+    '''
+    renaming = model.renaming(b)
+    renamed = {model.substitute(term_b, renaming): term_b for term_b in b}
+    selected_a = selected_b = None
+    if selection is not None:
+        selected_a = selection(a)
+        selected_b = selection(b)
+        if selected_b is not None:
+            selected_b = model.substitute(selected_b, renaming)
+    b = frozenset(renamed)
+
+    for term_a in a:
+        if selected_a is not None and term_a is not selected_a:
+            continue
+        for term_b in b:
+            if pairs is not None and (term_a, renamed[term_b]) not in pairs:
+                continue
+            if selected_b is not None and term_b is not selected_b:
+                continue
+
+            # Ordered binary reduction, for everything but equalities
+            if (type(term_a) is model.Not) != (type(term_b) is model.Not):
+                neg_term = (term_a if type(term_a) is model.Not else term_b)
+                pos_term = (term_b if type(term_a) is model.Not else term_a)
+
+                if not index.is_equality(pos_term):
+                    for mgu in ac.unifiers(neg_term.body, pos_term):
+                        if (eligible(term_a, a, selected_a, mgu, ordering) and
+                                eligible(term_b, b, selected_b, mgu, ordering)):
+                            yield (a - {term_a}) | (b - {term_b}), mgu, ('reduction', pos_term)
+
+            # Superposition, each way around
+            for from_clause, equality, into_clause, literal, selected in (
+                    (a, term_a, b, term_b, (selected_a, selected_b)),
+                    (b, term_b, a, term_a, (selected_b, selected_a))):
+                if index.is_equality(equality):
+                    for rewritten, mgu, note in superpositions(from_clause, equality, into_clause, literal, ordering, selected):
+                        yield (a - {term_a}) | (b - {term_b}) | {rewritten}, mgu, ('paramodulation', (note[0], note[1], mgu))
+
+def reductions(a, b, ordering, pairs = None, selection = None):
+    '''
+    The superposition counterpart of deduction.reductions.
+    '''
+    for literals, mgu, note in inferences(a, b, ordering, pairs, selection):
+        yield model.sub_all(literals, mgu), note
+
+def equality_resolutions(clause, ordering, selection = None):
+    '''
+    Drop a negated equality whose sides unify, if it is maximal or
+    selected. Yields (literals, unifier, note), as inferences does.
+    '''
+    selected = None if selection is None else selection(clause)
+    for literal in clause:
+        if selected is not None and literal is not selected:
+            continue
+        if type(literal) is model.Not and index.is_equality(literal.body):
+            for mgu in ac.unifiers(*literal.body.arguments):
+                if eligible(literal, clause, selected, mgu, ordering):
+                    yield clause - {literal}, mgu, ('equality resolution', literal)
+
+def equality_factorings(clause, ordering, selection = None):
+    '''
+    Factor s = t with s' = t' where s and s' unify, into s' = t' and
+    t != t', if s = t is maximal and s is not smaller than t. Without it,
+    superposition is incomplete for clauses with several positive
+    equalities. Yields (literals, unifier, note), as inferences does.
+    '''
+    selected = None if selection is None else selection(clause)
+    equalities = [x for x in clause if type(x) is not model.Not and index.is_equality(x)]
+    for literal in equalities:
+        for s, t in (literal.arguments, reversed(literal.arguments)):
+            for other in equalities:
+                if other is literal:
+                    continue
+                for s2, t2 in (other.arguments, reversed(other.arguments)):
+                    for mgu in ac.unifiers(s, s2):
+                        if (not ordering.greater(model.substitute(t, mgu), model.substitute(s, mgu)) and
+                                eligible(literal, clause, selected, mgu, ordering)):
+                            disequality = model.Not(model.Relation(0, model.Args(t, t2)))
+                            yield (clause - {literal}) | {disequality}, mgu, ('equality factoring', literal)
+
+def factorings(clause, ordering, selection = None):
+    '''
+    Factor two positive literals that unify, other than equalities, which
+    equality factoring covers, if they are maximal and nothing is
+    selected. With no ordering, any two are factored. Yields (literals,
+    unifier, note), as inferences does.
+    '''
+    selected = None if selection is None else selection(clause)
+    if selected is not None:
+        return
+    atoms = [x for x in clause if type(x) is not model.Not and not index.is_equality(x)]
+    for i, literal in enumerate(atoms):
+        for other in atoms[i + 1:]:
+            for mgu in ac.unifiers(literal, other):
+                if ordering is None or eligible(literal, clause, None, mgu, ordering):
+                    yield clause - {other}, mgu, ('factoring', other)
@@ -0,0 +1,119 @@
+import model
+
+'''
+VARIANTS: clauses that are the same up to renaming their variables.
+
+The shape of a literal is the literal with its own variables numbered
+-1, -2, ... in order of first occurrence, an interned term like any
+other. The variant hash of a clause is made of the shapes of its
+literals and of which of them share which variables, so variants hash
+alike whatever their variables and the order of their literals. Hashes
+can collide, so clauses that hash alike are compared exactly.
+
+The canonical form of a clause takes its literals in order of shape and
+numbers its variables in order of first occurrence. Literals of the same
+shape can still be taken either way round, so variants always hash alike
+but do not always have the same canonical form.
+'''
+
+# Memoized clauses and shapes are dropped once there are this many
+MEMO_SIZE = 1 << 13
+
+def antireflexive(literal):
+    return (type(literal) is model.Not and
+        type(literal.body) is model.Relation and
+        literal.body.relation == 0 and
+        literal.body.arguments[0] == literal.body.arguments[1])
+
+# The shape of a literal, and its variables in the order they are numbered
+def shape(literal):
+    variables = model.all_variables(literal)
+    sub = {x: -i - 1 for i, x in enumerate(variables) if x != -i - 1}
+    return (model.substitute(literal, sub) if sub else literal), variables
+
+def order(literals, shape = shape):
+    return sorted(literals, key = lambda x: hash(shape(x)[0]))
+
+class Canonicalizer:
+    def __init__(self):
+        self.shapes = {}
+        # Each clause seen, and its canonical form, to the canonical
+        # form and the variant hash
+        self.memo = {}
+
+    def shape(self, literal):
+        result = self.shapes.get(literal)
+        if result is None:
+            result = self.shapes[literal] = shape(literal)
+        return result
+
+    def order(self, literals):
+        return order(literals, self.shape)
+
+    def variant_hash(self, literals):
+        shapes = []
+        occurrences = {}
+        for literal in literals:
+            form, variables = self.shape(literal)
+            shapes.append(hash(form))
+            for j, x in enumerate(variables):
+                occurrences.setdefault(x, []).append((hash(form), j))
+        return hash((
+            tuple(sorted(shapes)),
+            tuple(sorted(tuple(sorted(x)) for x in occurrences.values()))
+        ))
+
+    def canon(self, clause):
+        '''
+        The canonical form of a clause, without its antireflexive
+        literals, and its variant hash.
+        '''
+        result = self.memo.get(clause)
+        if result is not None:
+            return result
+
+        if len(self.memo) >= MEMO_SIZE:
+            self.memo.clear()
+            self.shapes.clear()
+
+        literals = self.order(x for x in clause if not antireflexive(x))
+        sub = {}
+        for literal in literals:
+            for x in self.shape(literal)[1]:
+                if x not in sub:
+                    sub[x] = -len(sub) - 1
+        if all(x == y for x, y in sub.items()):
+            canonical = frozenset(literals) if len(literals) < len(clause) else clause
+        else:
+            canonical = model.sub_all(literals, sub)
+
+        result = self.memo[clause] = self.memo[canonical] = (canonical, self.variant_hash(canonical))
+        return result
+
+    def is_variant(self, a, b):
+        '''
+        Whether clauses a and b are the same up to renaming variables.
+        '''
+        if len(a) != len(b):
+            return False
+
+        candidates = {}
+        for y in b:
+            candidates.setdefault(self.shape(y)[0], []).append(y)
+        # The literals with the fewest candidates narrow the search first
+        a = sorted(a, key = lambda x: len(candidates.get(self.shape(x)[0], ())))
+
+        def extend(i, forward, backward, used):
+            if i == len(a):
+                return True
+            form, xs = self.shape(a[i])
+            for y in candidates.get(form, ()):
+                if y in used:
+                    continue
+                f, g = dict(forward), dict(backward)
+                if all(f.setdefault(x, z) == z and g.setdefault(z, x) == x for x, z in zip(xs, self.shape(y)[1])):
+                    if extend(i + 1, f, g, used | {y}):
+                        return True
+            return False
+
+        return extend(0, {}, {}, frozenset())